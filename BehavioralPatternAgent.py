@@ -1,51 +1,55 @@
 from strands import Agent, tool
-from typing import Dict, Any, List
-import json
+from typing import Dict, Any, List, Optional
 from datetime import datetime
-from aws_bedrock import converse_with_claude_stream
 from config import config
-from vector_utils import search_similar
+from agent_utils import ANALYSIS_UNAVAILABLE, IndicatorTiers, analysis_cache_get, analysis_cache_key, analysis_cache_set, dumps_pretty, get_expert_analysis, load_index, normalized_alert, prewarm_indexes, retrieve_sop, run_batch
 import logging
 
-def load_json(filename):
-    try:
-        with open(f'datasets/{filename}', 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading {filename}: {e}")
-        return {}
+# Anomaly indicators
+HIGH_ANOMALY_INDICATORS = [
+    'high anomaly', 'significant deviation', 'unusual pattern',
+    'suspicious behavior', 'anomalous activity', 'red flag'
+]
+
+MEDIUM_ANOMALY_INDICATORS = [
+    'medium anomaly', 'some concern', 'monitoring required'
+]
+
+LOW_ANOMALY_INDICATORS = [
+    'low anomaly', 'normal behavior', 'expected pattern'
+]
+
+# All tiers compile into one matcher so scoring scans the analysis once
+ANOMALY_TIERS = IndicatorTiers([
+    (HIGH_ANOMALY_INDICATORS, 0.4),
+    (MEDIUM_ANOMALY_INDICATORS, 0.1),
+    (LOW_ANOMALY_INDICATORS, -0.3),
+])
+
+# Static prompt skeleton; only the specialized prompts, details and SOPs vary
+BEHAVIORAL_PROMPT_TEMPLATE = """
+You are a behavioral pattern analyst specializing in time-series analysis and social engineering detection.
+
+{anomaly_prompt}
+{social_engineering_prompt}
+
+ANOMALY DETAILS:
+{details}
 
-def normalize_field_names(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Normalize field names to handle both old and new formats"""
-    normalized = {}
-    
-    # Field name mappings
-    field_mappings = {
-        'alert_id': ['alertId', 'alert_id'],
-        'customer_id': ['customerId', 'customer_id'],
-        'transaction_id': ['transactionId', 'transaction_id'],
-        'rule_id': ['ruleId', 'rule_id'],
-        'payee_payer_name': ['payeePayerName', 'payee_payer_name', 'payee'],
-        'transaction_type': ['transactionType', 'transaction_type'],
-        'transaction_date': ['transactionDate', 'transaction_date'],
-        'amount': ['amount'],
-        'currency': ['currency'],
-        'risk_score': ['riskScore', 'risk_score'],
-        'escalation_level': ['escalationLevel', 'escalation_level']
-    }
-    
-    for normalized_name, possible_names in field_mappings.items():
-        for old_name in possible_names:
-            if old_name in data:
-                normalized[normalized_name] = data[old_name]
-                break
-    
-    # Copy any other fields that don't have mappings
-    for key, value in data.items():
-        if key not in [name for names in field_mappings.values() for name in names]:
-            normalized[key] = value
-    
-    return normalized
+RELEVANT SOPs:
+{sop_summary}
+
+ANALYSIS REQUIREMENTS:
+1. Extract and summarize behavioral anomalies and patterns
+2. Detect device/IP switching and unusual access patterns
+3. Identify social engineering indicators and manipulation tactics
+4. Analyze temporal patterns and timing anomalies
+5. Assess behavioral biometrics and device familiarity
+6. Highlight escalation triggers and compliance issues
+7. Recommend behavioral monitoring measures
+
+Provide a comprehensive, expert-level behavioral analysis.
+"""
 
 class BehavioralPatternAgent(Agent):
     def __init__(self):
@@ -56,36 +60,52 @@ class BehavioralPatternAgent(Agent):
         )
         self.agent_config = config.get_agent_config(self.name)
         self.logger = logging.getLogger(self.name)
+        
+        # Resolve specialized prompts once; they don't change per alert
+        specialized_prompts = self.agent_config.specialized_prompts
+        self._anomaly_prompt = specialized_prompts.get('anomaly_detection',
+            "Detect behavioral anomalies and patterns")
+        self._social_engineering_prompt = specialized_prompts.get('social_engineering',
+            "Identify social engineering indicators")
+        
+        # Parse and index the datasets off the request path so the first alert sees warm caches
+        prewarm_indexes([('FTP.json', 'alerts'), ('Enhanced_Customer_Call_History.json', 'calls')])
 
     @tool
     def analyze_behavior(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze behavioral patterns and detect anomalies and social engineering indicators."""
         try:
+            # Normalize the alert once - handles both field name formats
+            alert = normalized_alert(context)
+            customer_id = alert.get('customer_id')
+            alert_id = alert.get('alert_id')
+            
             # Get dynamic SOPs based on behavioral context
-            behavioral_query = self._build_behavioral_query(context)
+            behavioral_query = self._build_behavioral_query(alert)
             sops = self._retrieve_sop(context, query=behavioral_query)
             
-            # Get anomaly details dynamically - handle both field name formats
-            alert = context.get('transaction', {})
-            customer_id = (alert.get('customer_id') or alert.get('customerId'))
-            alert_id = (alert.get('alert_id') or alert.get('alertId'))
-            
-            print(f"DEBUG: BehavioralPatternAgent - customer_id: {customer_id}, alert_id: {alert_id}")
+            self.logger.debug("customer_id: %s, alert_id: %s", customer_id, alert_id)
             
             if not customer_id:
-                print("WARNING: No customer ID found in alert data")
+                self.logger.warning("No customer ID found in alert data")
                 context['anomaly_context'] = "Customer ID not available in alert data"
                 return context
             
-            # Dynamically load anomaly details
-            anomaly_details = self._load_anomaly_details(customer_id, alert_id)
-            
-            # Build intelligent analysis prompt
-            prompt = self._build_behavioral_analysis_prompt(anomaly_details, sops)
-            
-            result = self._get_expert_analysis(
-                prompt + "\n\nPrioritize signals: remote access, OTP disclosure, urgency, secrecy, impersonation scripts."
-            )
+            # Reuse a recent analysis of the same case and SOPs without rebuilding the prompt
+            cache_key = analysis_cache_key(self.name, customer_id, alert_id, sops)
+            result = analysis_cache_get(cache_key, self.agent_config.cache_ttl) if self.agent_config.enable_caching else None
+            if result is None:
+                # Dynamically load anomaly details
+                anomaly_details = self._load_anomaly_details(customer_id, alert_id)
+                
+                # Build intelligent analysis prompt
+                prompt = self._build_behavioral_analysis_prompt(anomaly_details, sops)
+                
+                result = self._get_expert_analysis(
+                    prompt + "\n\nPrioritize signals: remote access, OTP disclosure, urgency, secrecy, impersonation scripts."
+                )
+                if self.agent_config.enable_caching:
+                    analysis_cache_set(cache_key, result)
             
             # Add to context with metadata
             context['anomaly_context'] = result
@@ -97,41 +117,31 @@ class BehavioralPatternAgent(Agent):
             context['context_summary'] = result
             context['agent_summary'] = f"Behavioral analysis completed for {case_id}"
             
-            self.logger.info(f"Behavioral analysis completed for case: {context.get('transaction', {}).get('alert_id', 'Unknown')}")
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Behavioral analysis completed for case: %s", alert_id or 'Unknown')
             return context
         except Exception as e:
-            self.logger.error(f"Error in analyze_behavior: {str(e)}")
+            self.logger.error("Error in analyze_behavior: %s", e)
             context['anomaly_context'] = "Error occurred during behavioral analysis"
             context['behavioral_analysis_error'] = str(e)
             return context
 
-    def _build_behavioral_query(self, context: Dict[str, Any]) -> str:
-        """Build intelligent query for behavioral analysis"""
-        alert = context.get('transaction', {})
+    def analyze_behavior_batch(self, contexts: List[Dict[str, Any]], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Analyze behavioral patterns for many alerts concurrently, overlapping the LLM round trips."""
+        return run_batch(self.analyze_behavior, contexts, max_workers=max_workers)
+
+    def _build_behavioral_query(self, alert: Dict[str, Any]) -> str:
+        """Build intelligent query for behavioral analysis from the normalized alert"""
         query_parts = []
         
-        if isinstance(alert, dict):
-            customer_id = alert.get('customerId', '')
-            if customer_id:
-                query_parts.append(f"customer behavior {customer_id}")
+        customer_id = alert.get('customer_id', '')
+        if customer_id:
+            query_parts.append(f"customer behavior {customer_id}")
         
         return " ".join(query_parts) if query_parts else "behavioral anomaly detection"
 
     def _retrieve_sop(self, context, query=None):
-        # Dynamic RAG: use vector search if query provided
-        if query:
-            hits = search_similar(query, top_k=3)
-            return [hit['text'] if isinstance(hit, dict) and 'text' in hit else str(hit) for hit in hits]
-        # Fallback: simple keyword search over SOP.md
-        sops = []
-        try:
-            with open('datasets/SOP.md', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        sops.append(line.strip())
-        except Exception as e:
-            self.logger.error(f"Error reading SOP file: {str(e)}")
-        return sops
+        return retrieve_sop(context, query=query, logger=self.logger)
 
     def _load_anomaly_details(self, customer_id: str, alert_id: str) -> Dict[str, Any]:
         """Dynamically load anomaly details from multiple sources"""
@@ -139,87 +149,33 @@ class BehavioralPatternAgent(Agent):
         
         # Try FTP data first
         try:
-            ftp_data = load_json('FTP.json')
-            if isinstance(ftp_data, dict) and 'alerts' in ftp_data:
-                ftp_alerts = ftp_data['alerts']
-            elif isinstance(ftp_data, list):
-                ftp_alerts = ftp_data
-            else:
-                ftp_alerts = []
-            
-            # Handle both old and new field names
-            for alert in ftp_alerts:
-                normalized_alert = normalize_field_names(alert)
-                if (normalized_alert.get('customer_id') == customer_id or 
-                    normalized_alert.get('alert_id') == alert_id):
-                    anomaly_details = normalized_alert
-                    break
+            anomaly_details = load_index('FTP.json', 'alerts').find(customer_id, alert_id) or {}
         except Exception as e:
-            self.logger.error(f"Error loading FTP data for anomaly analysis: {e}")
+            self.logger.error("Error loading FTP data for anomaly analysis: %s", e)
         
         # Try call history if no FTP match
         if not anomaly_details:
             try:
-                call_data = load_json('Enhanced_Customer_Call_History.json')
-                if isinstance(call_data, dict) and 'calls' in call_data:
-                    calls = call_data['calls']
-                elif isinstance(call_data, list):
-                    calls = call_data
-                else:
-                    calls = []
-                
-                # Handle both old and new field names
-                for call in calls:
-                    normalized_call = normalize_field_names(call)
-                    if (normalized_call.get('customer_id') == customer_id or 
-                        normalized_call.get('alert_id') == alert_id):
-                        anomaly_details = normalized_call
-                        break
+                anomaly_details = load_index('Enhanced_Customer_Call_History.json', 'calls').find(customer_id, alert_id) or {}
             except Exception as e:
-                self.logger.error(f"Error loading call history for anomaly analysis: {e}")
+                self.logger.error("Error loading call history for anomaly analysis: %s", e)
         
         return anomaly_details if anomaly_details else {'status': 'anomaly_details_unavailable'}
 
     def _build_behavioral_analysis_prompt(self, anomaly_details: Dict[str, Any], sops: List[str]) -> str:
         """Build intelligent behavioral analysis prompt"""
-        specialized_prompts = self.agent_config.specialized_prompts
-        
-        anomaly_prompt = specialized_prompts.get('anomaly_detection',
-            "Detect behavioral anomalies and patterns")
-        
-        social_engineering_prompt = specialized_prompts.get('social_engineering',
-            "Identify social engineering indicators")
-        
         # Build anomaly summary
         anomaly_summary = self._build_anomaly_summary(anomaly_details)
         
         # Build SOP summary
         sop_summary = "\n".join(sops[:5]) if sops else "No specific SOPs found"
         
-        prompt = f"""
-You are a behavioral pattern analyst specializing in time-series analysis and social engineering detection.
-
-{anomaly_prompt}
-{social_engineering_prompt}
-
-ANOMALY DETAILS:
-{json.dumps(anomaly_details, indent=2)}
-
-RELEVANT SOPs:
-{sop_summary}
-
-ANALYSIS REQUIREMENTS:
-1. Extract and summarize behavioral anomalies and patterns
-2. Detect device/IP switching and unusual access patterns
-3. Identify social engineering indicators and manipulation tactics
-4. Analyze temporal patterns and timing anomalies
-5. Assess behavioral biometrics and device familiarity
-6. Highlight escalation triggers and compliance issues
-7. Recommend behavioral monitoring measures
-
-Provide a comprehensive, expert-level behavioral analysis.
-"""
-        return prompt
+        return BEHAVIORAL_PROMPT_TEMPLATE.format(
+            anomaly_prompt=self._anomaly_prompt,
+            social_engineering_prompt=self._social_engineering_prompt,
+            details=dumps_pretty(anomaly_details),
+            sop_summary=sop_summary,
+        )
 
     def _build_anomaly_summary(self, anomaly_details: Dict[str, Any]) -> str:
         """Build intelligent anomaly summary"""
@@ -246,54 +202,13 @@ Provide a comprehensive, expert-level behavioral analysis.
 
     def _get_expert_analysis(self, prompt: str) -> str:
         """Get expert analysis with error handling"""
-        try:
-            result = "".join([token for token in converse_with_claude_stream([
-                {"role": "user", "content": [{"text": prompt}]}
-                ], max_tokens=self.agent_config.max_tokens)])
-            return result
-        except Exception as e:
-            self.logger.error(f"Failed to get expert analysis: {e}")
-            return "Analysis unavailable due to technical issues"
+        return get_expert_analysis(prompt, self.agent_config.max_tokens, logger=self.logger)
 
     def _calculate_anomaly_score(self, result: str) -> float:
         """Calculate anomaly score based on analysis"""
-        if not result or result == "Analysis unavailable due to technical issues":
+        if not result or result == ANALYSIS_UNAVAILABLE:
             return 0.5  # Default medium anomaly
         
-        result_lower = result.lower()
-        
-        # Anomaly indicators
-        high_anomaly_indicators = [
-            'high anomaly', 'significant deviation', 'unusual pattern',
-            'suspicious behavior', 'anomalous activity', 'red flag'
-        ]
-        
-        medium_anomaly_indicators = [
-            'medium anomaly', 'some concern', 'monitoring required'
-        ]
-        
-        low_anomaly_indicators = [
-            'low anomaly', 'normal behavior', 'expected pattern'
-        ]
-        
-        # Calculate score
-        score = 0.5  # Base score
-        
-        for indicator in high_anomaly_indicators:
-            if indicator in result_lower:
-                score += 0.4
-                break
-        
-        for indicator in medium_anomaly_indicators:
-            if indicator in result_lower:
-                score += 0.1
-                break
-        
-        for indicator in low_anomaly_indicators:
-            if indicator in result_lower:
-                score -= 0.3
-                break
-        
-        return max(0.0, min(1.0, score))
+        return ANOMALY_TIERS.score(result.lower())
 
 behavioral_pattern_agent = BehavioralPatternAgent()
\ No newline at end of file
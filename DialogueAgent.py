@@ -1,33 +1,130 @@
 from strands import Agent, tool
 from typing import Dict, Any, List, Optional, Tuple
+import hashlib
 import json
 from datetime import datetime
-from aws_bedrock import converse_with_claude_stream
+from functools import lru_cache
 from config import config
-from vector_utils import search_similar
+from agent_utils import KeywordMatcher, cached_lower, load_fraud_yaml_blocks, stream_completion
 import logging
-import yaml
-
-def load_fraud_yaml_blocks(filepath):
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-    blocks = content.split('---')
-    parsed = []
+import re
+import threading
+from collections import OrderedDict
+
+# Substring indicators scanned in the lowercased dialogue text
+STRONG_INDICATORS = [
+    'anydesk', 'teamviewer', 'remote access', 'read out the security codes', 'otp', 'one-time password',
+    'security code', 'bank security department', 'payid details', 'guided me step-by-step'
+]
+EARLY_FINALIZATION_INDICATORS = ['scam', 'fraud', 'remote access', 'anydesk', 'teamviewer']
+REMOTE_ACCESS_RISK_INDICATORS = ['anydesk', 'teamviewer', 'remote access', 'security code', 'otp', 'one-time password']
+PRESSURE_RISK_INDICATORS = ['bank security department', 'urgent', 'pressure', 'secrecy']
+
+# Fact keyword groups, all matched by one scan of the dialogue text
+AUTHORIZATION_CONFIRMED_KEYWORDS = frozenset({'yes', 'authorize'})
+AUTHORIZATION_DENIED_KEYWORDS = frozenset({'no', 'authorize'})
+KNOWN_RELATIONSHIP_KEYWORDS = frozenset({'know', 'familiar', 'friend', 'family'})
+UNKNOWN_RELATIONSHIP_KEYWORDS = frozenset({'unknown', 'stranger', 'never met'})
+SCAM_KEYWORDS = frozenset({'scam', 'fraud', 'suspicious'})
+URGENCY_KEYWORDS = frozenset({'urgent', 'hurry', 'quickly', 'immediately'})
+REMOTE_ACCESS_KEYWORDS = frozenset({'anydesk', 'teamviewer', 'remote access', 'screen sharing'})
+FACT_KEYWORDS = KeywordMatcher(
+    AUTHORIZATION_CONFIRMED_KEYWORDS | AUTHORIZATION_DENIED_KEYWORDS | KNOWN_RELATIONSHIP_KEYWORDS
+    | UNKNOWN_RELATIONSHIP_KEYWORDS | SCAM_KEYWORDS | URGENCY_KEYWORDS | REMOTE_ACCESS_KEYWORDS
+)
+
+def _compile_indicators(indicators: List[str]) -> re.Pattern:
+    # One alternation scans the text once instead of one `in` pass per indicator
+    return re.compile('|'.join(map(re.escape, indicators)))
+
+_STRONG_RE = _compile_indicators(STRONG_INDICATORS)
+_EARLY_FINALIZATION_RE = _compile_indicators(EARLY_FINALIZATION_INDICATORS)
+_RISK_RE = _compile_indicators(REMOTE_ACCESS_RISK_INDICATORS)
+_URGENCY_RE = _compile_indicators(PRESSURE_RISK_INDICATORS)
+
+# Phrases that mark a split fragment as the question to keep; matched anywhere, like `in`
+QUESTION_HINTS = ['have you', 'did you', 'can you', 'do you', 'what', 'when', 'where', 'why', 'how', 'who']
+# IGNORECASE spares lowercasing each fragment; '?' folds the explicit mark into the same scan
+_QUESTION_HINT_RE = re.compile('|'.join(map(re.escape, ['?'] + QUESTION_HINTS)), re.IGNORECASE)
+
+def _user_text_lower(dialogue_history: List[Dict[str, Any]], memo: Optional[Dict[str, Any]] = None) -> str:
+    """All customer answers joined and lowercased, extended incrementally when a case memo is given"""
+    answers = [turn.get('user', '') for turn in dialogue_history if isinstance(turn, dict)]
+    if memo is None:
+        return " ".join(answers).lower()
+    cached = memo.get('user_text_lower')
+    if cached is not None:
+        seen, text = cached
+        # Orchestrators fill in answers outside conduct_dialogue, so reuse only
+        # while the answers seen so far are still the same string objects
+        if len(seen) <= len(answers) and all(a is b for a, b in zip(seen, answers)):
+            if len(seen) == len(answers):
+                return text
+            suffix = " ".join(answers[len(seen):]).lower()
+            text = f"{text} {suffix}" if seen else suffix
+            memo['user_text_lower'] = (answers, text)
+            return text
+    text = " ".join(answers).lower()
+    memo['user_text_lower'] = (answers, text)
+    return text
+
+@lru_cache(maxsize=1024)
+def _dialogue_risk_score(risk_text: str, customer_text: str, user_text: str) -> float:
+    """Risk score from the lowercased risk summary, customer context and customer answers"""
+    # Pure in its inputs, which repeat turn over turn until a new answer arrives
+    risk_score = 0.5  # Default
+    
+    # Add risk from context
+    if 'high risk' in risk_text:
+        risk_score += 0.3
+    elif 'medium risk' in risk_text:
+        risk_score += 0.1
+    
+    # Add risk from customer context
+    if 'high-risk' in customer_text:
+        risk_score += 0.2
+    elif 'vulnerable' in customer_text:
+        risk_score += 0.1
+
+    # Strong signals from dialogue content directly
+    if _RISK_RE.search(user_text):
+        risk_score += 0.3
+    if _URGENCY_RE.search(user_text):
+        risk_score += 0.2
+    
+    return min(1.0, risk_score)
+
+def _turn_key(turn: Any) -> Tuple[Any, ...]:
+    """Hashable identity of a dialogue turn for the per-context caches"""
+    if isinstance(turn, dict):
+        return (turn.get('question', ''), turn.get('user', ''))
+    return (str(turn),)
+
+def _cache_key(*parts: Any) -> str:
+    """Digest of parts as a str key; the caches live in session state that is sent as JSON"""
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+def _asked_before(question_lower: str, asked: List[str], asked_blob: str) -> bool:
+    """any(question_lower in q for q in asked), as one search of the NUL-joined questions"""
+    if question_lower and "\0" not in question_lower:
+        return question_lower in asked_blob
+    return any(question_lower in q for q in asked)
+
+def _index_by_fraud_type(blocks: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Map lowercased fraud_type -> block; the first block for a type wins, as with a scan"""
+    index = {}
     for block in blocks:
-        block = block.strip()
         if block:
-            try:
-                loaded = yaml.safe_load(block)
-                if isinstance(loaded, dict):  # Only keep dicts
-                    parsed.append(loaded)
-            except Exception:
-                continue
-    return parsed
+            index.setdefault(str(block.get('fraud_type', '')).lower(), block)
+    return index
 
 def rag_retrieve_questions(context, query=None):
-    # Dynamic RAG: use vector search if query provided
+    # Dynamic RAG: use vector search if query provided. The seeds come from a small
+    # fixed vocabulary, so repeats are served from the shared proximity cache
     if query:
-        hits = search_similar(query, top_k=3)
+        # Imported here so loading the agent doesn't pull in qdrant-client
+        from sop_cache import search_similar_cached
+        hits = search_similar_cached(query, top_k=3)
         return [hit['text'] if isinstance(hit, dict) and 'text' in hit else str(hit) for hit in hits]
     # Fallback: simple keyword search over questions.md
     questions = []
@@ -40,6 +137,9 @@ def rag_retrieve_questions(context, query=None):
         pass
     return questions
 
+# Cases whose dialogue memos the agent keeps; the least recently used case is dropped first
+CASE_MEMO_MAX_CASES = 256
+
 class DialogueAgent(Agent):
     def __init__(self):
         super().__init__(
@@ -51,6 +151,12 @@ class DialogueAgent(Agent):
         self.logger = logging.getLogger(self.name)
         self.fraud_questions = load_fraud_yaml_blocks('datasets/questions.md')
         self.fraud_sop = load_fraud_yaml_blocks('datasets/SOP.md')
+        self._fraud_index = _index_by_fraud_type(self.fraud_questions)
+        self._sop_index = _index_by_fraud_type(self.fraud_sop)
+        # Incremental dialogue memos per case. They live here rather than on the context,
+        # which is session state serialised to the UI on every update
+        self._case_memos: OrderedDict = OrderedDict()
+        self._case_memo_lock = threading.Lock()
 
     @tool
     def conduct_dialogue(self, context: Dict[str, Any], user_response: Optional[str] = None, max_turns: Optional[int] = None) -> Tuple[Dict[str, Any], bool]:
@@ -81,7 +187,7 @@ class DialogueAgent(Agent):
                     
                     # Store dialogue summary when complete
                     case_id = context.get('transaction', {}).get('alert_id') or context.get('transaction', {}).get('customer_id') or 'unknown'
-                    dialogue_summary = self._build_conversation_summary(dialogue_history)
+                    dialogue_summary = self._build_conversation_summary(dialogue_history, context)
                     context['customer_interaction'] = dialogue_summary
                     context['agent_summary'] = f"Dialogue interaction completed for {case_id}"
 
@@ -93,17 +199,29 @@ class DialogueAgent(Agent):
 
     def get_fraud_block(self, rule_id: str) -> Optional[Dict[str, Any]]:
         """Get fraud block dynamically based on rule ID"""
-        for block in self.fraud_questions:
-            if block and block.get('fraud_type', '').lower() == rule_id.lower():
-                return block
-        return None
+        return self._fraud_index.get(rule_id.lower())
+
+    def _case_memo(self, context: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """The agent-side memo dict for the context's case, or None when the case has no alert id"""
+        txn = context.get('transaction') if isinstance(context, dict) else None
+        case_id = (txn.get('alert_id') or txn.get('alertId')) if isinstance(txn, dict) else None
+        if not case_id:
+            return None
+        # Entries are checked against the turns they were built from, so cases sharing an id stay correct
+        case_id = str(case_id)
+        with self._case_memo_lock:
+            memo = self._case_memos.get(case_id)
+            if memo is None:
+                memo = self._case_memos[case_id] = {}
+                if len(self._case_memos) > CASE_MEMO_MAX_CASES:
+                    self._case_memos.popitem(last=False)
+            else:
+                self._case_memos.move_to_end(case_id)
+        return memo
 
     def get_sop_block(self, rule_id: str) -> Optional[Dict[str, Any]]:
         """Get SOP block dynamically based on rule ID"""
-        for block in self.fraud_sop:
-            if block and block.get('fraud_type', '').lower() == rule_id.lower():
-                return block
-        return None
+        return self._sop_index.get(rule_id.lower())
 
     def extract_facts_intelligently(self, dialogue_history: List[Dict[str, Any]], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Intelligent fact extraction with dynamic confidence scoring (OPTIMIZED)"""
@@ -111,13 +229,14 @@ class DialogueAgent(Agent):
             context = {}
         
         # OPTIMIZATION: Cache fact extraction results
-        cache_key = f"extract_facts_{len(dialogue_history)}_{hash(str(dialogue_history[-1:]) if dialogue_history else '')}"
+        cache_key = _cache_key(len(dialogue_history), *map(_turn_key, dialogue_history[-1:]))
         
-        if hasattr(context, 'extract_cache') and cache_key in context.get('extract_cache', {}):
-            return context['extract_cache'][cache_key]
+        extract_cache = context.get('extract_cache')
+        if extract_cache is not None and cache_key in extract_cache:
+            return extract_cache[cache_key]
         
         # Use the base class intelligent fact extraction
-        dialogue_text = self._build_dialogue_text(dialogue_history)
+        dialogue_text = self._build_dialogue_text(dialogue_history, context)
         facts = self._extract_facts_from_text(dialogue_text, context)
         
         # Add context-based facts
@@ -138,49 +257,67 @@ class DialogueAgent(Agent):
         if not dialogue_text:
             return facts
         
-        text_lower = dialogue_text.lower()
+        # One scan finds every keyword; each fact below is then a set check
+        found = FACT_KEYWORDS.findall(dialogue_text.lower())
         
         # Extract authorization facts
-        if 'yes' in text_lower and 'authorize' in text_lower:
+        if AUTHORIZATION_CONFIRMED_KEYWORDS <= found:
             facts['authorization'] = {'value': 'confirmed', 'confidence': 0.9, 'source': 'dialogue'}
-        elif 'no' in text_lower and 'authorize' in text_lower:
+        elif AUTHORIZATION_DENIED_KEYWORDS <= found:
             facts['authorization'] = {'value': 'denied', 'confidence': 0.9, 'source': 'dialogue'}
         
         # Extract relationship facts
-        if any(word in text_lower for word in ['know', 'familiar', 'friend', 'family']):
+        if KNOWN_RELATIONSHIP_KEYWORDS & found:
             facts['relationship'] = {'value': 'known', 'confidence': 0.7, 'source': 'dialogue'}
-        elif any(word in text_lower for word in ['unknown', 'stranger', 'never met']):
+        elif UNKNOWN_RELATIONSHIP_KEYWORDS & found:
             facts['relationship'] = {'value': 'unknown', 'confidence': 0.8, 'source': 'dialogue'}
         
         # Extract scam indicators
-        if any(word in text_lower for word in ['scam', 'fraud', 'suspicious']):
+        if SCAM_KEYWORDS & found:
             facts['scam_suspected'] = {'value': 'yes', 'confidence': 0.9, 'source': 'dialogue'}
         
         # Extract urgency indicators
-        if any(word in text_lower for word in ['urgent', 'hurry', 'quickly', 'immediately']):
+        if URGENCY_KEYWORDS & found:
             facts['urgency'] = {'value': 'high', 'confidence': 0.8, 'source': 'dialogue'}
         
         # Extract remote access indicators
-        if any(word in text_lower for word in ['anydesk', 'teamviewer', 'remote access', 'screen sharing']):
+        if REMOTE_ACCESS_KEYWORDS & found:
             facts['remote_access'] = {'value': 'detected', 'confidence': 0.95, 'source': 'dialogue'}
         
         return facts
 
-    def _build_dialogue_text(self, dialogue_history: List[Dict[str, Any]]) -> str:
-        """Build dialogue text for fact extraction"""
-        dialogue_parts = []
-        
+    def _build_dialogue_text(self, dialogue_history: List[Dict[str, Any]], context: Optional[Dict[str, Any]] = None) -> str:
+        """Build dialogue text for fact extraction, formatting only new turns when the case has a memo"""
+        # Flat (question, answer, question, answer, ...) so the cached prefix can be checked by identity
+        fields = []
         for turn in dialogue_history:
             if isinstance(turn, dict):
-                question = turn.get('question', '')
-                user_response = turn.get('user', '')
-                
-                if question:
-                    dialogue_parts.append(f"Q: {question}")
-                if user_response:
-                    dialogue_parts.append(f"A: {user_response}")
-        
-        return " ".join(dialogue_parts)
+                fields.append(turn.get('question', ''))
+                fields.append(turn.get('user', ''))
+        
+        start, text = 0, ''
+        memo = self._case_memo(context)
+        cached = memo.get('dialogue_text') if memo is not None else None
+        if cached is not None:
+            seen, cached_text = cached
+            # Answers land on the last turn after it was first seen, so a changed field means a rebuild
+            if len(seen) <= len(fields) and all(a is b for a, b in zip(seen, fields)):
+                if len(seen) == len(fields):
+                    return cached_text
+                start, text = len(seen), cached_text
+        
+        dialogue_parts = [text] if text else []
+        for i in range(start, len(fields), 2):
+            question, user_response = fields[i], fields[i + 1]
+            if question:
+                dialogue_parts.append(f"Q: {question}")
+            if user_response:
+                dialogue_parts.append(f"A: {user_response}")
+        text = " ".join(dialogue_parts)
+        
+        if memo is not None:
+            memo['dialogue_text'] = (fields, text)
+        return text
 
     def _extract_context_facts(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """Extract facts from context data"""
@@ -188,13 +325,13 @@ class DialogueAgent(Agent):
         
         # Extract from transaction context
         if 'transaction_context' in context:
-            txn_text = context['transaction_context'].lower()
+            txn_text = cached_lower(context, 'transaction_context')
             if 'verified' in txn_text or 'confirmed' in txn_text:
                 context_facts['verification'] = {'value': 'confirmed', 'confidence': 0.8, 'source': 'context'}
         
         # Extract from customer context
         if 'customer_context' in context:
-            cust_text = context['customer_context'].lower()
+            cust_text = cached_lower(context, 'customer_context')
             if 'high-risk' in cust_text:
                 context_facts['risk_level'] = {'value': 'high', 'confidence': 0.9, 'source': 'context'}
             elif 'medium-risk' in cust_text:
@@ -202,7 +339,7 @@ class DialogueAgent(Agent):
         
         # Extract from risk context
         if 'risk_summary_context' in context:
-            risk_text = context['risk_summary_context'].lower()
+            risk_text = cached_lower(context, 'risk_summary_context')
             if 'scam' in risk_text:
                 context_facts['scam_indicated'] = {'value': 'yes', 'confidence': 0.8, 'source': 'context'}
         
@@ -225,7 +362,7 @@ class DialogueAgent(Agent):
         
         return '\n'.join(fact_summaries)
 
-    def summarize_missing_facts(self, facts: Dict[str, Any], dialogue_history: List[Dict[str, Any]]) -> List[str]:
+    def summarize_missing_facts(self, facts: Dict[str, Any], dialogue_history: List[Dict[str, Any]], context: Optional[Dict[str, Any]] = None) -> List[str]:
         """Intelligent missing fact identification"""
         # Get required facts from configuration
         required_facts = ['authorization', 'relationship', 'verification_method', 'purpose']
@@ -234,26 +371,22 @@ class DialogueAgent(Agent):
         missing = [fact_type for fact_type in required_facts if fact_type not in facts]
         
         # Check for early finalization conditions
-        dialogue_text = self._build_dialogue_text(dialogue_history).lower()
+        dialogue_text = self._build_dialogue_text(dialogue_history, context).lower()
         
         # Early finalization indicators
-        early_finalization_indicators = ['scam', 'fraud', 'remote access', 'anydesk', 'teamviewer']
-        early_finalization = any(indicator in dialogue_text for indicator in early_finalization_indicators)
+        early_finalization = _EARLY_FINALIZATION_RE.search(dialogue_text) is not None
         
         # Check dialogue length
         max_turns = 8
         max_turns_reached = len(dialogue_history) >= max_turns
         
         # Check for repetitive responses
-        user_responses = [turn.get('user', '').strip().lower() for turn in dialogue_history if 'user' in turn]
+        user_responses = [cached_lower(turn, 'user').strip() for turn in dialogue_history if 'user' in turn]
         repetitive_responses = len(user_responses) != len(set(user_responses)) and len(user_responses) > 6
         
         # Strong fraud indicators override missing facts
-        text = (" ".join([turn.get('user','') for turn in dialogue_history if isinstance(turn, dict)])).lower()
-        strong_indicators = any(k in text for k in [
-            'anydesk','teamviewer','remote access','read out the security codes','otp','one-time password','security code',
-            'bank security department','payid details','guided me step-by-step'
-        ])
+        text = _user_text_lower(dialogue_history, self._case_memo(context))
+        strong_indicators = _STRONG_RE.search(text) is not None
         
         # Allow finalization if any of these conditions are met
         if early_finalization or max_turns_reached or repetitive_responses or strong_indicators:
@@ -274,10 +407,11 @@ class DialogueAgent(Agent):
         fraud_block = self.get_fraud_block(rule_id)
         
         # OPTIMIZATION: Cache fact extraction results
-        cache_key = f"facts_{len(dialogue_history)}_{hash(str(dialogue_history[-2:]) if len(dialogue_history) >= 2 else '')}"
+        cache_key = _cache_key(len(dialogue_history), *(map(_turn_key, dialogue_history[-2:]) if len(dialogue_history) >= 2 else ()))
         
-        if hasattr(context, 'fact_cache') and cache_key in context.get('fact_cache', {}):
-            facts = context['fact_cache'][cache_key]
+        fact_cache = context.get('fact_cache')
+        if fact_cache is not None and cache_key in fact_cache:
+            facts = fact_cache[cache_key]
         else:
             # Extract facts intelligently
             facts = self.extract_facts_intelligently(dialogue_history, context)
@@ -286,35 +420,32 @@ class DialogueAgent(Agent):
                 context['fact_cache'] = {}
             context['fact_cache'][cache_key] = facts
         
-        # Get missing facts
-        missing = self.summarize_missing_facts(facts, dialogue_history)
-        
-        # OPTIMIZATION: Early termination based on dialogue length and risk
-        dialogue_length = len(dialogue_history)
-        risk_score = self._calculate_dialogue_risk_score(context)
-        
-        # Early termination conditions (include strong indicators)
-        text = (" ".join([turn.get('user','') for turn in dialogue_history if isinstance(turn, dict)])).lower()
-        strong_indicators = any(k in text for k in [
-            'anydesk','teamviewer','remote access','read out the security codes','otp','one-time password','security code',
-            'bank security department','payid details','guided me step-by-step'
-        ])
-        early_termination_conditions = [
-            dialogue_length >= 8,
-            risk_score >= 0.8,
-            not missing,
-            strong_indicators,
-        ]
+        # Customer answers lowercased once per new answer, shared by every indicator scan below
+        text = _user_text_lower(dialogue_history, self._case_memo(context))
         
-        if any(early_termination_conditions):
+        # Get missing facts
+        missing = self.summarize_missing_facts(facts, dialogue_history, context)
+        
+        # OPTIMIZATION: Early termination based on dialogue length, missing facts,
+        # strong indicators and risk, cheapest first so the risk score is only
+        # computed when nothing else has already decided
+        if (
+            len(dialogue_history) >= 8
+            or not missing
+            or _STRONG_RE.search(text) is not None
+            or self._calculate_dialogue_risk_score(context) >= 0.8
+        ):
             # Build final expert summary
             return self._build_final_summary(context, dialogue_history), self.name, True
         
-        # OPTIMIZATION: Use cached questions for common scenarios
-        question_cache_key = f"question_{rule_id}_{len(missing)}_{hash(str(missing[:2]))}"
+        # OPTIMIZATION: Use cached questions for common scenarios. The pick skips questions
+        # already asked, so the key covers them and a repeated seed is never served again
+        asked = tuple(turn.get('question', '') for turn in dialogue_history if isinstance(turn, dict) and 'question' in turn)
+        question_cache_key = _cache_key(rule_id, tuple(missing), asked)
         
-        if hasattr(context, 'question_cache') and question_cache_key in context.get('question_cache', {}):
-            next_question = context['question_cache'][question_cache_key]
+        question_cache = context.get('question_cache')
+        if question_cache is not None and question_cache_key in question_cache:
+            next_question = question_cache[question_cache_key]
         else:
             # Generate next intelligent question
             next_question = self._generate_next_question(missing, context, dialogue_history)
@@ -332,41 +463,20 @@ class DialogueAgent(Agent):
 
     def _calculate_dialogue_risk_score(self, context: Dict[str, Any]) -> float:
         """Calculate risk score for dialogue decisions"""
-        risk_score = 0.5  # Default
-        
-        # Add risk from context
-        if 'risk_summary_context' in context:
-            risk_text = context['risk_summary_context'].lower()
-            if 'high risk' in risk_text:
-                risk_score += 0.3
-            elif 'medium risk' in risk_text:
-                risk_score += 0.1
-        
-        # Add risk from customer context
-        if 'customer_context' in context:
-            customer_text = context['customer_context'].lower()
-            if 'high-risk' in customer_text:
-                risk_score += 0.2
-            elif 'vulnerable' in customer_text:
-                risk_score += 0.1
-
-        # Strong signals from dialogue content directly
-        dh = context.get('dialogue_history', [])
-        text = (" ".join([turn.get('user','') for turn in dh if isinstance(turn, dict)])).lower()
-        if any(k in text for k in ['anydesk','teamviewer','remote access','security code','otp','one-time password']):
-            risk_score += 0.3
-        if any(k in text for k in ['bank security department','urgent','pressure','secrecy']):
-            risk_score += 0.2
-        
-        return min(1.0, risk_score)
+        risk_text = cached_lower(context, 'risk_summary_context')
+        customer_text = cached_lower(context, 'customer_context')
+        text = _user_text_lower(context.get('dialogue_history', []), self._case_memo(context))
+        return _dialogue_risk_score(risk_text, customer_text, text)
 
     def _generate_next_question(self, missing_facts: List[str], context: Dict[str, Any], dialogue_history: List[Dict[str, Any]]) -> Optional[str]:
         """Generate intelligent next question based on missing facts"""
         if not missing_facts:
             return None
         
-        # Get already asked questions
-        already_asked = set(turn.get('question', '').lower() for turn in dialogue_history if 'question' in turn)
+        # Get already asked questions. They are LLM rewrites of the seeds, so a seed
+        # counts as asked when it appears inside one of them
+        already_asked = [cached_lower(turn, 'question') for turn in dialogue_history if 'question' in turn]
+        asked_blob = "\0".join(already_asked)
         
         # Try to find relevant questions for missing facts
         for missing_fact in missing_facts:
@@ -375,7 +485,7 @@ class DialogueAgent(Agent):
             
             for question in rag_questions:
                 question_lower = question.lower()
-                if not any(question_lower in asked for asked in already_asked):
+                if not _asked_before(question_lower, already_asked, asked_blob):
                     return question
         
         return None
@@ -394,7 +504,7 @@ class DialogueAgent(Agent):
         context_summary = self._build_dialogue_context_summary(context)
         
         # Build conversation summary
-        conversation_summary = self._build_conversation_summary(dialogue_history)
+        conversation_summary = self._build_conversation_summary(dialogue_history, context)
         
         # Show placeholders until finalization node completes
         final_risk = context.get('final_risk_determination', 'Final risk assessment will be computed now...')
@@ -440,9 +550,7 @@ Write a concise, directive summary appropriate for immediate customer communicat
 """
         
         try:
-            result = "".join([token for token in converse_with_claude_stream([
-                {"role": "user", "content": [{"text": prompt}]}
-            ], max_tokens=self.agent_config.max_tokens)])
+            result = self._complete(prompt, context)
             # If model still hedges, harden tone under XYZ SOPs
             if 'insufficient' in result.lower() or 'cannot' in result.lower():
                 result += "\n\nNote: Under XYZ APP fraud SOP, context is sufficient for policy decision due to BEC indicators."
@@ -451,6 +559,21 @@ Write a concise, directive summary appropriate for immediate customer communicat
             self.logger.error(f"Failed to build final summary: {e}")
             return "Investigation summary unavailable due to technical issues"
 
+    def _complete(self, prompt: str, context: Dict[str, Any]) -> str:
+        """Stream one Claude completion, reusing the result when the case repeats a prompt"""
+        # Re-entering the dialogue after the expert gate rebuilds the same final-summary
+        # prompt, so the case's earlier answer is returned instead of a second invocation
+        memo = self._case_memo(context)
+        key = hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).digest()
+        # Only the case's latest completion is kept, so each case holds at most one answer
+        cached = memo.get('completion') if memo is not None else None
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        result = stream_completion(prompt, self.agent_config.max_tokens)
+        if memo is not None and result and not result.startswith("Configuration/Invocation error"):
+            memo['completion'] = (key, result)
+        return result
+
     def _build_dialogue_context_summary(self, context: Dict[str, Any]) -> str:
         """Build intelligent COMPRESSED dialogue context summary"""
         summary_parts = []
@@ -466,7 +589,7 @@ Write a concise, directive summary appropriate for immediate customer communicat
         
         # COMPRESSED RISK SUMMARY
         if 'risk_summary_context' in context:
-            risk_text = context['risk_summary_context'].lower()
+            risk_text = cached_lower(context, 'risk_summary_context')
             risk_level = "HIGH" if "high" in risk_text else "MEDIUM" if "medium" in risk_text else "LOW"
             summary_parts.append(f"RISK: {risk_level}")
             
@@ -484,7 +607,7 @@ Write a concise, directive summary appropriate for immediate customer communicat
         
         # COMPRESSED CUSTOMER SUMMARY
         if 'customer_context' in context:
-            cust_text = context['customer_context'].lower()
+            cust_text = cached_lower(context, 'customer_context')
             if 'high-risk' in cust_text:
                 summary_parts.append("CUSTOMER: HIGH-RISK")
             elif 'vulnerable' in cust_text:
@@ -494,8 +617,21 @@ Write a concise, directive summary appropriate for immediate customer communicat
         
         return " | ".join(summary_parts) if summary_parts else "CONTEXT: Limited"
 
-    def _build_conversation_summary(self, dialogue_history: List[Dict[str, Any]]) -> str:
-        """Build intelligent COMPRESSED conversation summary"""
+    def _build_conversation_summary(self, dialogue_history: List[Dict[str, Any]], context: Optional[Dict[str, Any]] = None) -> str:
+        """Build intelligent COMPRESSED conversation summary, memoized per case"""
+        memo = self._case_memo(context)
+        if memo is None:
+            return self._summarize_conversation(dialogue_history)
+        # The summary only reads the last three turns plus the turn count
+        key = (len(dialogue_history),) + tuple(map(_turn_key, dialogue_history[-3:]))
+        cached = memo.get('conv_summary')
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        summary = self._summarize_conversation(dialogue_history)
+        memo['conv_summary'] = (key, summary)
+        return summary
+
+    def _summarize_conversation(self, dialogue_history: List[Dict[str, Any]]) -> str:
         if not dialogue_history:
             return "No conversation history available"
         
@@ -525,8 +661,8 @@ Write a concise, directive summary appropriate for immediate customer communicat
             
             for turn in recent_turns:
                 if isinstance(turn, dict):
-                    question = turn.get('question', '').lower()
-                    answer = turn.get('user', '').lower()
+                    question = cached_lower(turn, 'question')
+                    answer = cached_lower(turn, 'user')
                     
                     # Extract key information
                     if 'authorize' in answer or 'confirm' in answer:
@@ -559,7 +695,7 @@ Write a concise, directive summary appropriate for immediate customer communicat
         # Build context summary
         context_summary = self._build_dialogue_context_summary(context)
         # Build conversation summary
-        conversation_summary = self._build_conversation_summary(dialogue_history)
+        conversation_summary = self._build_conversation_summary(dialogue_history, context)
         
         prompt = f"""
 You are a senior fraud analyst acting like a methodical detective. Your goal is to determine whether this is an AUTHORIZED PAYMENT SCAM (APP) or legitimate.
@@ -584,9 +720,7 @@ FORMAT: Return only the question, nothing else.
 """
         
         try:
-            result = "".join([token for token in converse_with_claude_stream([
-                {"role": "user", "content": [{"text": prompt}]}
-            ], max_tokens=self.agent_config.max_tokens)])
+            result = self._complete(prompt, context)
             
             # Clean and validate the response to ensure only one question
             cleaned_result = self._clean_and_validate_question(result)
@@ -601,7 +735,7 @@ FORMAT: Return only the question, nothing else.
 
     def _generate_investigative_question(self, facts: Dict[str, Any], context: Dict[str, Any], dialogue_history: List[Dict[str, Any]]) -> Optional[str]:
         """Fallback deterministic investigative question selection when RAG has no items."""
-        asked = set(turn.get('question', '').strip().lower() for turn in dialogue_history if isinstance(turn, dict) and 'question' in turn)
+        asked = {cached_lower(turn, 'question').strip() for turn in dialogue_history if isinstance(turn, dict) and 'question' in turn}
         probes = [
             "Are you currently on a call or screen-sharing with anyone who asked you to make this payment?",
             "Did anyone contact you claiming to be from the bank, police, ATO, or a company to guide this payment?",
@@ -633,7 +767,7 @@ FORMAT: Return only the question, nothing else.
                 # Find the first part that looks like a question
                 for part in parts:
                     part = part.strip()
-                    if part and ('?' in part or any(word in part.lower() for word in ['have you', 'did you', 'can you', 'do you', 'what', 'when', 'where', 'why', 'how', 'who'])):
+                    if part and _QUESTION_HINT_RE.search(part):
                         # Ensure it ends with a question mark
                         if not part.endswith('?'):
                             part = part.rstrip('.') + '?'
@@ -1,11 +1,75 @@
 from strands import Agent, tool
-from typing import Dict, Any, List
-import json
-from datetime import datetime
-from aws_bedrock import converse_with_claude_stream
+from typing import Dict, Any, Callable, List, Optional
 from config import config
-from vector_utils import search_similar
+from agent_utils import KeywordMatcher, now_iso, retrieve_sop, stream_completion
 import logging
+import re
+
+# Improvement area -> phrases in the feedback that flag it, in reporting order
+IMPROVEMENT_AREAS = {
+    'detection_accuracy': ['missed indicators', 'false positive', 'false negative'],
+    'customer_interaction': ['empathy', 'dialogue quality', 'question appropriateness'],
+    'risk_indicators': ['new patterns', 'red flags', 'sop updates'],
+    'decision_effectiveness': ['policy action', 'regulatory compliance'],
+    'system_performance': ['data points', 'agent performance', 'process optimization']
+}
+
+IMPROVEMENT_AREA_OF = {
+    indicator: area for area, indicators in IMPROVEMENT_AREAS.items() for indicator in indicators
+}
+
+# Every area's phrases compile into one matcher so the feedback is scanned once
+IMPROVEMENT_KEYWORDS = KeywordMatcher(IMPROVEMENT_AREA_OF)
+
+# Verdict checks as case-insensitive substring searches, so the risk text and
+# policy decision are not lowercased per case; the lookaheads allow either order
+_SCAM_VERDICT_RE = re.compile(r'(?=.*?yes)(?=.*?authorized scam)', re.IGNORECASE | re.DOTALL)
+_BLOCK_RE = re.compile('block', re.IGNORECASE)
+
+# Static role and specialized prompts, sent as the system prompt
+FEEDBACK_SYSTEM_TEMPLATE = """
+You are an expert feedback collector for the AUTHORIZED SCAM prevention system.
+
+{feedback_prompt}
+{improvement_prompt}
+"""
+
+FEEDBACK_PROMPT_TEMPLATE = """
+CASE SUMMARY:
+{case_summary}
+
+RELEVANT SOPs:
+{sop_summary}
+
+GENERATE FEEDBACK COLLECTION FOCUSING ON:
+
+1. DETECTION ACCURACY:
+   - Was this correctly identified as an authorized scam?
+   - What indicators did we miss?
+   - False positive/negative assessment?
+
+2. CUSTOMER INTERACTION QUALITY:
+   - Were questions empathetic and appropriate?
+   - Did we identify customer vulnerability?
+   - Was the dialogue length optimal?
+
+3. RISK INDICATORS:
+   - New scam patterns observed?
+   - Behavioral red flags we should add?
+   - SOPs that need updating?
+
+4. DECISION EFFECTIVENESS:
+   - Was the policy action appropriate?
+   - Customer outcome (if known)?
+   - Regulatory compliance gaps?
+
+5. SYSTEM IMPROVEMENTS:
+   - Additional data points needed?
+   - Agent performance issues?
+   - Process optimization opportunities?
+
+FORMAT: Create specific questions an analyst can answer to improve future detection. Include rating scales where appropriate (1-5) and text fields for detailed feedback.
+"""
 
 class FeedbackCollectorAgent(Agent):
     def __init__(self):
@@ -16,37 +80,56 @@ class FeedbackCollectorAgent(Agent):
         )
         self.agent_config = config.get_agent_config(self.name)
         self.logger = logging.getLogger(self.name)
+        
+        # Resolve specialized prompts once; they don't change per case
+        specialized_prompts = self.agent_config.specialized_prompts
+        feedback_prompt = specialized_prompts.get('feedback_generation',
+            "Generate structured feedback questions to improve detection and customer protection")
+        improvement_prompt = specialized_prompts.get('improvement_analysis',
+            "Analyze system performance and identify improvement opportunities")
+        self._system_prompt = FEEDBACK_SYSTEM_TEMPLATE.format(
+            feedback_prompt=feedback_prompt,
+            improvement_prompt=improvement_prompt,
+        )
 
     @tool
     def collect_feedback(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """Collect feedback and generate improvement suggestions based on case outcomes."""
+        return self.stream_feedback(context)
+
+    def stream_feedback(self, context: Dict[str, Any], on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """collect_feedback, handing each model token to on_token as it is generated"""
         try:
-            # Get dynamic SOPs based on feedback context
-            feedback_query = self._build_feedback_query(context)
-            sops = self._retrieve_sop(context, query=feedback_query)
-            
-            # Get the final determinations
-            final_risk = context.get('final_risk_determination', context.get('risk_assessment_summary', '[Not available]'))
-            policy_decision = context.get('policy_decision', '[Not available]')
-            
-            # Build intelligent feedback prompt
-            prompt = self._build_feedback_prompt(context, final_risk, policy_decision, sops)
+            prompt = self._prepare_prompt(context)
             
             # Get expert feedback
-            result = self._get_expert_feedback(prompt)
+            result = self._get_expert_feedback(prompt, on_token=on_token)
             
             # Add to context with metadata
             context['feedback'] = result
-            context['feedback_timestamp'] = datetime.now().isoformat()
+            context['feedback_timestamp'] = now_iso()
             context['improvement_priorities'] = self._extract_improvement_priorities(result)
             
-            self.logger.info(f"Feedback collection completed for case: {context.get('transaction', {}).get('alert_id', 'Unknown')}")
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Feedback collection completed for case: %s", context.get('transaction', {}).get('alert_id', 'Unknown'))
             return context
         except Exception as e:
-            self.logger.error(f"Error in collect_feedback: {str(e)}")
+            self.logger.error("Error in collect_feedback: %s", e)
             context['feedback_error'] = str(e)
             return context
 
+    def _prepare_prompt(self, context: Dict[str, Any]) -> str:
+        """SOP lookup and feedback prompt assembly in one step over the case context"""
+        # Get dynamic SOPs based on feedback context
+        sops = self._retrieve_sop(context, query=self._build_feedback_query(context))
+        
+        # Get the final determinations
+        final_risk = context.get('final_risk_determination', context.get('risk_assessment_summary', '[Not available]'))
+        policy_decision = context.get('policy_decision', '[Not available]')
+        
+        # Build intelligent feedback prompt
+        return self._build_feedback_prompt(context, final_risk, policy_decision, sops)
+
     def _build_feedback_query(self, context: Dict[str, Any]) -> str:
         """Build intelligent query for feedback analysis"""
         query_parts = []
@@ -61,116 +144,54 @@ class FeedbackCollectorAgent(Agent):
         
         return " ".join(query_parts) if query_parts else "authorized scam feedback collection"
 
+    def sop_query(self, context: Dict[str, Any]) -> str:
+        """The SOP query collect_feedback will issue once the policy decision is in context"""
+        # The query only checks that a policy decision exists, not what it says
+        return self._build_feedback_query({**context, 'policy_decision': None})
+
     def _retrieve_sop(self, context, query=None):
-        # Dynamic RAG: use vector search if query provided
-        if query:
-            hits = search_similar(query, top_k=3)
-            return [hit['text'] if isinstance(hit, dict) and 'text' in hit else str(hit) for hit in hits]
-        # Fallback: simple keyword search over SOP.md
-        sops = []
-        try:
-            with open('datasets/SOP.md', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        sops.append(line.strip())
-        except Exception as e:
-            self.logger.error(f"Error reading SOP file: {str(e)}")
-        return sops
+        return retrieve_sop(context, query=query, logger=self.logger)
 
     def _build_feedback_prompt(self, context: Dict[str, Any], final_risk: str, policy_decision: str, sops: List[str]) -> str:
         """Build intelligent feedback prompt"""
-        specialized_prompts = self.agent_config.specialized_prompts
-        
-        feedback_prompt = specialized_prompts.get('feedback_generation',
-            "Generate structured feedback questions to improve detection and customer protection")
-        
-        improvement_prompt = specialized_prompts.get('improvement_analysis',
-            "Analyze system performance and identify improvement opportunities")
-        
         # Build case summary
         case_summary = self._build_case_summary(context, final_risk, policy_decision)
         
         # Build SOP summary
         sop_summary = "\n".join(sops[:5]) if sops else "No specific SOPs found"
         
-        prompt = f"""
-You are an expert feedback collector for the AUTHORIZED SCAM prevention system.
-
-{feedback_prompt}
-{improvement_prompt}
-
-CASE SUMMARY:
-{case_summary}
-
-RELEVANT SOPs:
-{sop_summary}
-
-GENERATE FEEDBACK COLLECTION FOCUSING ON:
-
-1. DETECTION ACCURACY:
-   - Was this correctly identified as an authorized scam?
-   - What indicators did we miss?
-   - False positive/negative assessment?
-
-2. CUSTOMER INTERACTION QUALITY:
-   - Were questions empathetic and appropriate?
-   - Did we identify customer vulnerability?
-   - Was the dialogue length optimal?
-
-3. RISK INDICATORS:
-   - New scam patterns observed?
-   - Behavioral red flags we should add?
-   - SOPs that need updating?
-
-4. DECISION EFFECTIVENESS:
-   - Was the policy action appropriate?
-   - Customer outcome (if known)?
-   - Regulatory compliance gaps?
-
-5. SYSTEM IMPROVEMENTS:
-   - Additional data points needed?
-   - Agent performance issues?
-   - Process optimization opportunities?
-
-FORMAT: Create specific questions an analyst can answer to improve future detection. Include rating scales where appropriate (1-5) and text fields for detailed feedback.
-"""
-        return prompt
+        return FEEDBACK_PROMPT_TEMPLATE.format(
+            case_summary=case_summary,
+            sop_summary=sop_summary,
+        )
 
     def _build_case_summary(self, context: Dict[str, Any], final_risk: str, policy_decision: str) -> str:
         """Build intelligent case summary for feedback"""
-        summary_parts = []
-        
-        # Transaction summary
-        if 'transaction' in context:
-            txn = context['transaction']
-            if isinstance(txn, dict):
-                amount = txn.get('amount', 'Unknown')
-                payee = txn.get('payee', 'Unknown')
-                summary_parts.append(f"Transaction: ${amount} to {payee}")
-        
         # Risk assessment summary
-        scam_detected = 'yes' in final_risk.lower() and 'authorized scam' in final_risk.lower()
-        summary_parts.append(f"Final Risk Assessment: {'SCAM DETECTED' if scam_detected else 'CHECK ASSESSMENT'}")
+        scam_detected = _SCAM_VERDICT_RE.match(final_risk) is not None
+        verdict = 'SCAM DETECTED' if scam_detected else 'CHECK ASSESSMENT'
         
         # Policy decision summary
-        blocked = 'block' in str(policy_decision).lower()
-        summary_parts.append(f"Policy Action: {'BLOCKED' if blocked else 'CHECK DECISION'}")
+        blocked = _BLOCK_RE.search(str(policy_decision)) is not None
+        action = 'BLOCKED' if blocked else 'CHECK DECISION'
         
         # Dialogue summary
         dialogue_turns = len(context.get('dialogue_history', []))
-        summary_parts.append(f"Dialogue Turns: {dialogue_turns}")
+        summary = f"Final Risk Assessment: {verdict}\nPolicy Action: {action}\nDialogue Turns: {dialogue_turns}"
         
-        return "\n".join(summary_parts)
+        # Transaction summary leads when the alert is available
+        txn = context.get('transaction')
+        if isinstance(txn, dict):
+            return f"Transaction: ${txn.get('amount', 'Unknown')} to {txn.get('payee', 'Unknown')}\n{summary}"
+        return summary
 
-    def _get_expert_feedback(self, prompt: str) -> str:
+    def _get_expert_feedback(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
         """Get expert feedback with error handling"""
         try:
-            result = "".join([token for token in converse_with_claude_stream([
-                {"role": "user", "content": [{"text": prompt}]}
-            ], max_tokens=self.agent_config.max_tokens)])
-            return result
+            return stream_completion(prompt, self.agent_config.max_tokens, on_token=on_token,
+                                     system=self._system_prompt)
         except Exception as e:
-            self.logger.error(f"Failed to get expert feedback: {e}")
+            self.logger.error("Failed to get expert feedback: %s", e)
             return "Feedback collection unavailable due to technical issues"
 
     def _extract_improvement_priorities(self, result: str) -> List[str]:
@@ -178,22 +199,33 @@ FORMAT: Create specific questions an analyst can answer to improve future detect
         if not result:
             return []
         
-        priorities = []
-        result_lower = result.lower()
-        
-        # Identify improvement areas
-        improvement_areas = {
-            'detection_accuracy': ['missed indicators', 'false positive', 'false negative'],
-            'customer_interaction': ['empathy', 'dialogue quality', 'question appropriateness'],
-            'risk_indicators': ['new patterns', 'red flags', 'sop updates'],
-            'decision_effectiveness': ['policy action', 'regulatory compliance'],
-            'system_performance': ['data points', 'agent performance', 'process optimization']
-        }
-        
-        for area, indicators in improvement_areas.items():
-            if any(indicator in result_lower for indicator in indicators):
-                priorities.append(area)
-        
-        return priorities
+        found_areas = set()
+        for keywords in IMPROVEMENT_KEYWORDS.iter_matches(result.lower()):
+            found_areas.update(IMPROVEMENT_AREA_OF[keyword] for keyword in keywords)
+            # Once every area is flagged the rest of the feedback can't change the answer
+            if len(found_areas) == len(IMPROVEMENT_AREAS):
+                break
+        return [area for area in IMPROVEMENT_AREAS if area in found_areas]
+
+    def extract_improvement_priorities_batch(self, results: List[str]) -> List[List[str]]:
+        """_extract_improvement_priorities over many stored feedback texts, e.g. archives for retraining"""
+        import numpy as np
+        
+        areas = list(IMPROVEMENT_AREAS)
+        keywords = sorted({indicator for indicators in IMPROVEMENT_AREAS.values() for indicator in indicators})
+        column = {keyword: k for k, keyword in enumerate(keywords)}
+        # (n_keywords, n_areas) membership, so one matrix product reduces keyword hits to areas
+        membership = np.zeros((len(keywords), len(areas)), dtype=np.uint8)
+        for a, indicators in enumerate(IMPROVEMENT_AREAS.values()):
+            membership[[column[indicator] for indicator in indicators], a] = 1
+        
+        hits = np.zeros((len(results), len(keywords)), dtype=np.uint8)
+        for row, result in enumerate(results):
+            if result:
+                found = IMPROVEMENT_KEYWORDS.findall(result.lower())
+                hits[row, [column[keyword] for keyword in found]] = 1
+        
+        area_hits = (hits @ membership) > 0
+        return [[areas[a] for a in np.flatnonzero(row)] for row in area_hits]
 
 feedback_collector_agent = FeedbackCollectorAgent()
\ No newline at end of file
@@ -1,11 +1,65 @@
 from strands import Agent, tool
-from typing import Dict, Any, List
-import json
-from datetime import datetime
-from aws_bedrock import converse_with_claude_stream
+from typing import Dict, Any, Callable, List, Optional
 from config import config
-from vector_utils import search_similar
+from agent_utils import now_iso, retrieve_sop, stream_completion
 import logging
+import re
+from types import MappingProxyType
+
+# Read-only default for a missing transaction, shared instead of allocating {} per lookup
+_NO_TRANSACTION = MappingProxyType({})
+
+# Case-insensitive search spares a lowercased copy of the (often multi-KB) risk assessment
+_HIGH_RISK_RE = re.compile('high risk', re.IGNORECASE)
+_LOW_RISK_RE = re.compile('low risk', re.IGNORECASE)
+_VERIFIED_RE = re.compile('verified', re.IGNORECASE)
+# Both words anywhere in the dialogue, in either order
+_AUTHORIZATION_RE = re.compile(r'(?=.*?yes)(?=.*?authorize)', re.IGNORECASE | re.DOTALL)
+
+# Safeguards appended to BEC decisions per XYZ SOP
+BEC_CUSTOMER_PROTECTION = "CUSTOMER PROTECTION: Initiate urgent trace, freeze further similar payments, secure vendor verification, contact customer with BEC guidance"
+POLICY_COMPLIANCE = "COMPLIANCE: AUSTRAC SMR if funds misdirected; APRA CPG 234 operational controls; ASIC RG 271 customer protection"
+POLICY_DOCUMENTATION = "DOCUMENTATION: Record verification steps, analyst notes, and decision with timestamps"
+
+# Static role and specialized prompts, sent as the system prompt
+POLICY_SYSTEM_TEMPLATE = """
+YOU ARE AN EXPERT POLICY DECISION AGENT SPECIALIZING IN AUTHORIZED PAYMENT SCAM PREVENTION.
+
+{policy_decision_prompt}
+{customer_protection_prompt}
+"""
+
+POLICY_PROMPT_TEMPLATE = """
+FINAL RISK ASSESSMENT:
+{final_risk}
+
+COMPRESSED CONTEXT:
+{compressed_context}
+
+COMPRESSED RISK:
+{compressed_risk}
+
+COMPRESSED AGENT LOGS:
+{compressed_agent_logs}
+
+RELEVANT SOPs:
+{sop_summary}
+
+POLICY DECISION OPTIONS:
+1. BLOCK TRANSACTION - Prevent the payment immediately
+2. ESCALATE TO SENIOR - Complex case requiring management review
+3. PROCEED WITH WARNING - Allow but document customer was warned
+4. PROCEED - No scam indicators found
+
+PROVIDE YOUR DECISION WITH:
+- Selected action (1-4)
+- Specific regulatory/compliance justification (e.g., APRA CPG 234, AUSTRAC guidelines)
+- Customer protection measures to implement
+- Documentation requirements
+- Any follow-up actions needed
+
+Consider the customer's vulnerability, transaction amount, and reputational risk.
+"""
 
 class PolicyDecisionAgent(Agent):
     def __init__(self):
@@ -16,33 +70,43 @@ class PolicyDecisionAgent(Agent):
         )
         self.agent_config = config.get_agent_config(self.name)
         self.logger = logging.getLogger(self.name)
+        
+        # Resolve specialized prompts once; they don't change per case
+        specialized_prompts = self.agent_config.specialized_prompts
+        policy_decision_prompt = specialized_prompts.get('policy_decision',
+            "Make regulatory-compliant policy decisions based on investigation findings")
+        customer_protection_prompt = specialized_prompts.get('customer_protection',
+            "Implement customer protection measures and regulatory compliance")
+        self._system_prompt = POLICY_SYSTEM_TEMPLATE.format(
+            policy_decision_prompt=policy_decision_prompt,
+            customer_protection_prompt=customer_protection_prompt,
+        )
 
     @tool
     def make_policy_decision(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """Make policy decisions based on risk assessment and regulatory requirements."""
+        return self.stream_policy_decision(context)
+
+    def stream_policy_decision(self, context: Dict[str, Any], on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """make_policy_decision, handing each model token to on_token as it is generated"""
         try:
-            # Get dynamic SOPs based on policy context
-            policy_query = self._build_policy_query(context)
-            sops = self._retrieve_sop(context, query=policy_query)
-            
-            # Get the final risk assessment
-            final_risk = context.get('final_risk_determination', context.get('risk_assessment_summary', '[Not available]'))
-            
-            # Build intelligent policy prompt (tie to numeric risk if present). If BEC indicators present, prefer BEC safeguards.
-            if isinstance(context.get('overall_risk_score'), (int, float)):
-                final_risk = f"Overall Risk Score: {context.get('overall_risk_score'):.2f}\n" + (final_risk or '')
-            prompt = self._build_policy_decision_prompt(final_risk, context, sops)
-            
-            # Get expert policy decision
-            result = self._get_expert_policy_decision(prompt)
+            txn = context.get('transaction', _NO_TRANSACTION)
+            result = self._short_circuit_decision(context)
+            if result is None:
+                prompt = self._prepare_prompt(context, txn)
+                
+                # Get expert policy decision
+                result = self._get_expert_policy_decision(prompt, on_token=on_token)
+            elif on_token is not None:
+                on_token(result)
             
             # Add to context with metadata
             context['policy_decision'] = result
-            context['policy_decision_timestamp'] = datetime.now().isoformat()
+            context['policy_decision_timestamp'] = now_iso()
             
             # Populate regulatory requirements/compliance dict for UI
             try:
-                regs = self._get_regulatory_requirements(context)
+                regs = self._get_regulatory_requirements(context, txn)
                 if isinstance(regs, dict):
                     context['regulatory_requirements'] = regs
                     context['regulatory_compliance'] = regs
@@ -50,23 +114,62 @@ class PolicyDecisionAgent(Agent):
                 # Keep optional
                 pass
             
-            self.logger.info(f"Policy decision completed for case: {context.get('transaction', {}).get('alert_id', 'Unknown')}")
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Policy decision completed for case: %s", txn.get('alert_id', 'Unknown'))
             return context
         except Exception as e:
-            self.logger.error(f"Error in make_policy_decision: {str(e)}")
+            self.logger.error("Error in make_policy_decision: %s", e)
             context['policy_decision_error'] = str(e)
             return context
 
-    def _build_policy_query(self, context: Dict[str, Any]) -> str:
+    def _short_circuit_decision(self, context: Dict[str, Any]) -> Optional[str]:
+        """Templated BLOCK for cases whose outcome is already fixed, or None to ask the model"""
+        if not config.environment['POLICY_LLM_SHORTCIRCUIT']:
+            return None
+        bec_detected = bool((context.get('bec_indicators') or {}).get('bec_detected'))
+        score = context.get('overall_risk_score')
+        threshold = config.environment['POLICY_SHORTCIRCUIT_SCORE']
+        high_score = isinstance(score, (int, float)) and score >= threshold
+        if not (bec_detected or high_score):
+            return None
+        
+        reasons = []
+        if isinstance(score, (int, float)):
+            reasons.append(f"overall risk score {score:.2f} (block threshold {threshold:.2f})")
+        if bec_detected:
+            reasons.append("Business Email Compromise indicators detected")
+        protection = BEC_CUSTOMER_PROTECTION if bec_detected else (
+            "CUSTOMER PROTECTION: Hold the payment, contact the customer through a verified channel and provide scam guidance")
+        return "\n".join([
+            "POLICY DECISION: BLOCK TRANSACTION",
+            f"JUSTIFICATION: Automatic block - {'; '.join(reasons)}",
+            protection,
+            POLICY_COMPLIANCE,
+            POLICY_DOCUMENTATION,
+        ])
+
+    def _prepare_prompt(self, context: Dict[str, Any], txn: Any) -> str:
+        """SOP lookup and policy prompt assembly in one step over the case context"""
+        # Get dynamic SOPs based on policy context
+        sops = self._retrieve_sop(context, query=self._build_policy_query(context, txn))
+        
+        # Get the final risk assessment
+        final_risk = context.get('final_risk_determination', context.get('risk_assessment_summary', '[Not available]'))
+        
+        # Build intelligent policy prompt (tie to numeric risk if present). If BEC indicators present, prefer BEC safeguards.
+        overall_risk_score = context.get('overall_risk_score')
+        if isinstance(overall_risk_score, (int, float)):
+            final_risk = f"Overall Risk Score: {overall_risk_score:.2f}\n" + (final_risk or '')
+        return self._build_policy_decision_prompt(final_risk, context, sops)
+
+    def _build_policy_query(self, context: Dict[str, Any], txn: Any) -> str:
         """Build intelligent query for policy analysis"""
         query_parts = []
         
-        # Add transaction context
-        if 'transaction' in context:
-            txn = context['transaction']
-            if isinstance(txn, dict):
-                amount = txn.get('amount', 0)
-                query_parts.append(f"policy decision {amount}")
+        # Add transaction context (a missing transaction is the read-only default, not a dict)
+        if isinstance(txn, dict):
+            amount = txn.get('amount', 0)
+            query_parts.append(f"policy decision {amount}")
         
         # Add risk context
         if 'risk_assessment' in context:
@@ -74,32 +177,16 @@ class PolicyDecisionAgent(Agent):
         
         return " ".join(query_parts) if query_parts else "authorized scam policy decision"
 
+    def sop_query(self, context: Dict[str, Any]) -> str:
+        """The SOP query make_policy_decision will issue once the risk assessment is in context"""
+        # The query only checks that a risk assessment exists, so this holds before the final one runs
+        return self._build_policy_query({**context, 'risk_assessment': None}, context.get('transaction', _NO_TRANSACTION))
+
     def _retrieve_sop(self, context, query=None):
-        # Dynamic RAG: use vector search if query provided
-        if query:
-            hits = search_similar(query, top_k=3)
-            return [hit['text'] if isinstance(hit, dict) and 'text' in hit else str(hit) for hit in hits]
-        # Fallback: simple keyword search over SOP.md
-        sops = []
-        try:
-            with open('datasets/SOP.md', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        sops.append(line.strip())
-        except Exception as e:
-            self.logger.error(f"Error reading SOP file: {str(e)}")
-        return sops
+        return retrieve_sop(context, query=query, logger=self.logger)
 
     def _build_policy_decision_prompt(self, final_risk: str, context: Dict[str, Any], sops: List[str]) -> str:
         """Build intelligent policy decision prompt with COMPRESSED SUMMARIES"""
-        specialized_prompts = self.agent_config.specialized_prompts
-        
-        policy_decision_prompt = specialized_prompts.get('policy_decision',
-            "Make regulatory-compliant policy decisions based on investigation findings")
-        
-        customer_protection_prompt = specialized_prompts.get('customer_protection',
-            "Implement customer protection measures and regulatory compliance")
-        
         # Get compressed summaries from context
         compressed_agent_logs = context.get('compressed_agent_logs', 'AGENT LOGS: Not available')
         compressed_context = context.get('compressed_context_summary', 'CONTEXT: Not available')
@@ -108,110 +195,69 @@ class PolicyDecisionAgent(Agent):
         # Build SOP summary (reduced for speed)
         sop_summary = "\n".join(sops[:3]) if sops else "No specific SOPs found"
         
-        prompt = f"""
-YOU ARE AN EXPERT POLICY DECISION AGENT SPECIALIZING IN AUTHORIZED PAYMENT SCAM PREVENTION.
-
-{policy_decision_prompt}
-{customer_protection_prompt}
-
-FINAL RISK ASSESSMENT:
-{final_risk}
-
-COMPRESSED CONTEXT:
-{compressed_context}
-
-COMPRESSED RISK:
-{compressed_risk}
-
-COMPRESSED AGENT LOGS:
-{compressed_agent_logs}
-
-RELEVANT SOPs:
-{sop_summary}
-
-POLICY DECISION OPTIONS:
-1. BLOCK TRANSACTION - Prevent the payment immediately
-2. ESCALATE TO SENIOR - Complex case requiring management review
-3. PROCEED WITH WARNING - Allow but document customer was warned
-4. PROCEED - No scam indicators found
-
-PROVIDE YOUR DECISION WITH:
-- Selected action (1-4)
-- Specific regulatory/compliance justification (e.g., APRA CPG 234, AUSTRAC guidelines)
-- Customer protection measures to implement
-- Documentation requirements
-- Any follow-up actions needed
-
-Consider the customer's vulnerability, transaction amount, and reputational risk.
-"""
-        return prompt
+        return POLICY_PROMPT_TEMPLATE.format(
+            final_risk=final_risk,
+            compressed_context=compressed_context,
+            compressed_risk=compressed_risk,
+            compressed_agent_logs=compressed_agent_logs,
+            sop_summary=sop_summary,
+        )
 
     def _build_transaction_details(self, context: Dict[str, Any]) -> str:
         """Build intelligent transaction details summary"""
-        alert = context.get('transaction', {})
+        alert = context.get('transaction', _NO_TRANSACTION)
         if not alert or not isinstance(alert, dict):
             return "Transaction details unavailable"
         
-        details_parts = []
-        details_parts.append(f"Alert: {alert}")
-        details_parts.append(f"Amount: ${alert.get('amount', 'Unknown')}")
-        details_parts.append(f"Payee: {alert.get('payee', 'Unknown')}")
-        
-        return "\n".join(details_parts)
+        return f"Alert: {alert}\nAmount: ${alert.get('amount', 'Unknown')}\nPayee: {alert.get('payee', 'Unknown')}"
 
     def _build_investigation_summary(self, context: Dict[str, Any]) -> str:
         """Build intelligent investigation summary"""
-        summary_parts = []
-        
         # Customer verification
         dialogue_history = context.get('dialogue_history', [])
-        customer_verified = 'verified' in str(dialogue_history).lower()
-        summary_parts.append(f"- Customer verified: {'Yes' if customer_verified else 'Unknown'}")
+        # Stringify the whole history once for both checks
+        dialogue_text = str(dialogue_history)
+        customer_verified = _VERIFIED_RE.search(dialogue_text) is not None
         
         # Authorization status
-        authorization_confirmed = 'yes' in str(dialogue_history).lower() and 'authorize' in str(dialogue_history).lower()
-        summary_parts.append(f"- Authorization status: {'Confirmed' if authorization_confirmed else 'Check dialogue'}")
-        
-        # Dialogue turns
-        summary_parts.append(f"- Number of dialogue turns: {len(dialogue_history)}")
+        authorization_confirmed = _AUTHORIZATION_RE.match(dialogue_text) is not None
         
-        return "\n".join(summary_parts)
+        return (
+            f"- Customer verified: {'Yes' if customer_verified else 'Unknown'}\n"
+            f"- Authorization status: {'Confirmed' if authorization_confirmed else 'Check dialogue'}\n"
+            f"- Number of dialogue turns: {len(dialogue_history)}"
+        )
 
-    def _get_expert_policy_decision(self, prompt: str) -> str:
+    def _get_expert_policy_decision(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
         """Get expert policy decision with error handling"""
         try:
-            result = "".join([token for token in converse_with_claude_stream([
-                {"role": "user", "content": [{"text": prompt}]}
-            ], max_tokens=self.agent_config.max_tokens)])
+            result = stream_completion(prompt, self.agent_config.max_tokens, on_token=on_token,
+                                       system=self._system_prompt)
             # Standardize BEC decision outputs per XYZ SOP if BEC detected
             rl = result.lower()
             if 'business email compromise' in rl or 'bec' in rl:
                 if 'POLICY DECISION:' not in result:
                     result += "\n\nPOLICY DECISION: BLOCK TRANSACTION"
-                result += "\nCUSTOMER PROTECTION: Initiate urgent trace, freeze further similar payments, secure vendor verification, contact customer with BEC guidance"
-                result += "\nCOMPLIANCE: AUSTRAC SMR if funds misdirected; APRA CPG 234 operational controls; ASIC RG 271 customer protection"
-                result += "\nDOCUMENTATION: Record verification steps, analyst notes, and decision with timestamps"
+                result += f"\n{BEC_CUSTOMER_PROTECTION}\n{POLICY_COMPLIANCE}\n{POLICY_DOCUMENTATION}"
             return result
         except Exception as e:
-            self.logger.error(f"Failed to get expert policy decision: {e}")
+            self.logger.error("Failed to get expert policy decision: %s", e)
             return "Policy decision unavailable due to technical issues"
 
-    def _get_regulatory_requirements(self, context: Dict[str, Any]) -> Dict[str, Any]:
+    def _get_regulatory_requirements(self, context: Dict[str, Any], txn: Any) -> Dict[str, Any]:
         """Get regulatory requirements based on context"""
         # Get transaction amount
         amount = 0.0
-        if 'transaction' in context:
-            txn = context['transaction']
-            if isinstance(txn, dict):
-                amount = float(txn.get('amount', 0))
+        if isinstance(txn, dict):
+            amount = float(txn.get('amount', 0))
         
         # Get risk level
         risk_level = 'medium'  # default
         if 'risk_assessment' in context:
-            risk_text = context['risk_assessment'].lower()
-            if 'high risk' in risk_text:
+            risk_text = context['risk_assessment']
+            if _HIGH_RISK_RE.search(risk_text):
                 risk_level = 'high'
-            elif 'low risk' in risk_text:
+            elif _LOW_RISK_RE.search(risk_text):
                 risk_level = 'low'
         
         # Get requirements from config
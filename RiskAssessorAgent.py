@@ -1,11 +1,105 @@
 from strands import Agent, tool
 from typing import Dict, Any, List
 import json
-from datetime import datetime
-from aws_bedrock import converse_with_claude_stream
 from config import config
-from vector_utils import search_similar
+from agent_utils import KeywordMatcher, cached_lower, now_iso, retrieve_sop, stream_completion
 import logging
+import re
+
+# Dialogue facts and red flags -> answer phrases that signal them
+DIALOGUE_FACTS = {
+    "Customer authorized transaction": ['authorize', 'confirm'],
+    "Investment-related transaction": ['investment', 'return'],
+    "Romance/relationship context": ['romance', 'relationship'],
+    "Tech support scenario": ['tech support', 'computer'],
+}
+
+DIALOGUE_RED_FLAGS = {
+    "Customer mentioned scam/fraud": ['scam', 'fraud'],
+    "Pressure/urgency tactics detected": ['pressure', 'urgent'],
+    "Unknown/stranger relationship": ['unknown', 'stranger'],
+}
+
+DIALOGUE_SIGNAL_OF = {
+    keyword: signal
+    for signals in (DIALOGUE_FACTS, DIALOGUE_RED_FLAGS)
+    for signal, keywords in signals.items()
+    for keyword in keywords
+}
+
+DIALOGUE_SIGNAL_COUNT = len(DIALOGUE_FACTS) + len(DIALOGUE_RED_FLAGS)
+
+# Every signal's phrases compile into one matcher so the answers are scanned once
+DIALOGUE_KEYWORDS = KeywordMatcher(DIALOGUE_SIGNAL_OF)
+
+# Compressed summary labels -> phrase in the (lowercased) context text, in reporting order
+TRANSACTION_INDICATORS = {'VERIFIED': 'verified', 'SUSPICIOUS': 'suspicious'}
+CUSTOMER_INDICATORS = {'HIGH-RISK': 'high-risk', 'VULNERABLE': 'vulnerable'}
+RISK_FACTORS = {'SCAM': 'scam', 'FRAUD': 'fraud', 'SUSPICIOUS': 'suspicious', 'ANOMALY': 'anomaly'}
+
+TRANSACTION_INDICATOR_KEYWORDS = KeywordMatcher(TRANSACTION_INDICATORS.values())
+CUSTOMER_INDICATOR_KEYWORDS = KeywordMatcher(CUSTOMER_INDICATORS.values())
+# Risk level words ride along with the factors so the synthesis text is scanned once
+RISK_SUMMARY_KEYWORDS = KeywordMatcher([*RISK_FACTORS.values(), 'high', 'medium'])
+
+# Hedging phrases dropped from assessments once the expert gate has passed
+_HEDGING_RE = re.compile('insufficient|cannot make|unable to determine', re.IGNORECASE)
+# Case-insensitive searches spare lowercased copies of the model output
+_BEC_RE = re.compile('bec|business email compromise', re.IGNORECASE)
+_FINALIZE_RE = re.compile('finalize', re.IGNORECASE)
+
+# Explicit, deterministic rubric to avoid "insufficient data" when the gate already passed
+FINAL_ASSESSMENT_PROMPT_TEMPLATE = """
+You are an expert risk assessor specializing in authorized payment scams (APP fraud).
+
+{final_determination_prompt}
+
+Assume dialogue context is sufficient (expert gate passed). Use the rubric below and avoid stating that data is insufficient.
+
+COMPRESSED AGENT LOGS:
+{compressed_agent_logs}
+
+COMPLETE CUSTOMER DIALOGUE (compressed):
+{dialogue_summary}
+
+RELEVANT SOPs:
+{sop_summary}
+
+RUBRIC:
+- If remote access tools (AnyDesk/TeamViewer), OTP/code sharing, and impersonation of bank staff are present → Authorized Scam = Yes, Confidence = High.
+- If caller provided PayID/instructions and urgency/secrecy present → Authorized Scam = Yes, Confidence = High.
+- If relationship is verified, no social engineering, and legitimate invoice context → consider No or Medium with justification.
+
+OUTPUT (STRICT):
+1) AUTHORIZED_SCAM: Yes/No
+2) CONFIDENCE: High/Medium/Low
+3) INDICATORS: bullet list
+4) RED_FLAGS: bullet list
+5) ACTIONS: bullet list (customer protection + operational)
+6) TYPOLOGY: one of [business_email_compromise, impersonation, tech_support, romance, investment, purchase, other]
+"""
+
+# Expert-level compressed prompt for assessments during the dialogue
+PROGRESSIVE_ASSESSMENT_PROMPT_TEMPLATE = """
+XYZ Bank Expert Risk Assessment - COMPRESSED CONTEXT
+
+{compressed_context}
+{compressed_risk}
+{compressed_triage}
+
+DIALOGUE SUMMARY: {dialogue_summary}
+RELEVANT SOPs: {sop_summary}...
+
+EXPERT ASSESSMENT (SHORT BULLETS):
+- Risk Level: [HIGH/MEDIUM/LOW]
+- Scam Typology: [Type or None]
+- Sufficient Info: [Yes/No]
+- Next Action: [Ask <1 best question>/Finalize/Escalate]
+- Key Missing: [If any]
+
+IMPORTANT: If remote access, code sharing, and impersonation are detected, set Sufficient Info = Yes and recommend FINALIZE with High risk.
+If information is borderline, return exactly ONE targeted question that would unlock finalization.
+"""
 
 class RiskAssessorAgent(Agent):
     def __init__(self):
@@ -16,61 +110,70 @@ class RiskAssessorAgent(Agent):
         )
         self.agent_config = config.get_agent_config(self.name)
         self.logger = logging.getLogger(self.name)
+        
+        # Resolve the final determination prompt once; it doesn't change per case
+        specialized_prompts = self.agent_config.specialized_prompts
+        self._final_determination_prompt = specialized_prompts.get('final_determination',
+            "Make final scam determination based on complete investigation")
 
     @tool
     def assess_risk(self, context: Dict[str, Any], is_final: bool = False) -> Dict[str, Any]:
         """Assess risk based on current context and dialogue progress."""
         try:
             # Prevent unbounded calls: allow only one progressive and one final per case
-            if isinstance(context, dict):
-                flags = context.setdefault('risk_assessor_flags', {'progressive_done': False, 'final_done': False})
-            else:
+            # Flags stay a plain dict so the state remains serializable; the default is only built once per case
+            flags = context.get('risk_assessor_flags') if isinstance(context, dict) else None
+            if flags is None:
                 flags = {'progressive_done': False, 'final_done': False}
+                if isinstance(context, dict):
+                    context['risk_assessor_flags'] = flags
             
-            # Get dynamic SOPs based on risk assessment context
-            risk_query = self._build_risk_assessment_query(context)
-            sops = self._retrieve_sop(context, query=risk_query)
-            
-            # Check if this is during dialogue or final assessment
-            is_final_assessment = is_final or 'Final risk summary' in str(context) or 'final' in str(context).lower()
+            # Check if this is during dialogue or final assessment. Callers say so explicitly;
+            # stringifying the whole context matched the 'final_done' flag key above on every call
+            is_final_assessment = bool(is_final) or context.get('assessment_stage') == 'final'
+            # Repeat calls return before any retrieval or summary work
             if is_final_assessment and flags.get('final_done'):
                 return context
             if not is_final_assessment and flags.get('progressive_done'):
                 return context
             
+            # Get dynamic SOPs based on risk assessment context
+            risk_query = self._build_risk_assessment_query(context)
+            sops = self._retrieve_sop(context, query=risk_query)
+            
             # Build dialogue summary if available
             dialogue_summary = self._build_dialogue_summary(context)
             
+            # Compressed summaries feed the progressive prompt and are stored for the PolicyDecisionAgent;
+            # nothing they read changes during the assessment, so build them once
+            compressed_context = self._build_compressed_context_summary(context)
+            compressed_risk = self._build_compressed_risk_summary(context)
+            
             # Build intelligent assessment prompt
             if is_final_assessment:
                 prompt = self._build_final_assessment_prompt(context, dialogue_summary, sops)
             else:
-                prompt = self._build_progressive_assessment_prompt(context, dialogue_summary, sops)
+                prompt = self._build_progressive_assessment_prompt(context, dialogue_summary, sops,
+                                                                   compressed_context, compressed_risk)
             
             # Get expert assessment
             result = self._get_expert_assessment(prompt)
             
-            # Ensure typology normalization for BEC cases
-            if 'bec' in result.lower() or 'business email compromise' in result.lower():
-                if 'TYPOLOGY:' in result:
-                    # leave explicit block if present
-                    pass
-                else:
-                    result += "\n\nTYPOLOGY: business_email_compromise"
+            # Ensure typology normalization for BEC cases, leaving an explicit TYPOLOGY block alone.
+            # Final assessments are asked for that block, so the exact-case check usually settles it first
+            if 'TYPOLOGY:' not in result and _BEC_RE.search(result):
+                result += "\n\nTYPOLOGY: business_email_compromise"
             
             # Add to context with metadata
             # Enforce XYZ bank guidelines and avoid "insufficient" hedging if gating passed
             safe_result = result or ""
-            if context.get('gate_reason', {}).get('passed'):
+            gate = context.get('gate_reason')
+            if gate and gate.get('passed'):
                 # Remove hedging lines to avoid contradictory outputs when gate passed
                 try:
-                    filtered_lines = []
-                    for line in safe_result.splitlines():
-                        ll = line.strip().lower()
-                        if ('insufficient' in ll) or ('cannot make' in ll) or ('unable to determine' in ll):
-                            continue
-                        filtered_lines.append(line)
-                    safe_result = "\n".join(filtered_lines).strip()
+                    safe_result = "\n".join([
+                        line for line in safe_result.splitlines() if not _HEDGING_RE.search(line)
+                    ]).strip()
                 except Exception:
                     pass
                 # Add explicit note reinforcing finalization
@@ -78,15 +181,15 @@ class RiskAssessorAgent(Agent):
                     safe_result += "\n\nNote: Expert gate indicates sufficient context; proceed with final determination under XYZ APP fraud SOP."
             
             context['risk_assessment'] = safe_result
-            context['risk_assessment_timestamp'] = datetime.now().isoformat()
+            context['risk_assessment_timestamp'] = now_iso()
             context['assessment_type'] = 'final' if is_final_assessment else 'progressive'
             
             # Create and store compressed summaries for the PolicyDecisionAgent
-            context['compressed_context_summary'] = self._build_compressed_context_summary(context)
-            context['compressed_risk_summary'] = self._build_compressed_risk_summary(context)
+            context['compressed_context_summary'] = compressed_context
+            context['compressed_risk_summary'] = compressed_risk
 
             # Check if risk assessor recommends finalization
-            if not is_final_assessment and 'finalize' in safe_result.lower():
+            if not is_final_assessment and _FINALIZE_RE.search(safe_result):
                 context['risk_ready_to_finalize'] = True
                 
             # Add to context with metadata, without polluting final fields during progressive runs
@@ -97,54 +200,40 @@ class RiskAssessorAgent(Agent):
             else:
                 context['progressive_risk_assessment'] = safe_result
                 context['latest_risk_assessment'] = safe_result
-            context['risk_assessment_timestamp'] = datetime.now().isoformat()
             
             # Mark completion flags
             if is_final_assessment:
                 flags['final_done'] = True
             else:
                 flags['progressive_done'] = True
-            context['risk_assessor_flags'] = flags
 
-            self.logger.info(f"Risk assessment completed for case: {context.get('transaction', {}).get('alert_id', 'Unknown')}")
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Risk assessment completed for case: %s", context.get('transaction', {}).get('alert_id', 'Unknown'))
             return context
         except Exception as e:
-            self.logger.error(f"Error in assess_risk: {str(e)}")
+            self.logger.error("Error in assess_risk: %s", e)
             context['risk_assessment_error'] = str(e)
             return context
 
     def _build_risk_assessment_query(self, context: Dict[str, Any]) -> str:
         """Build intelligent query for risk assessment"""
-        query_parts = []
-        
-        # Add transaction context
-        if 'transaction' in context:
-            txn = context['transaction']
-            if isinstance(txn, dict):
-                amount = txn.get('amount', 0)
-                query_parts.append(f"transaction risk assessment {amount}")
-        
-        # Add dialogue context
-        if 'dialogue_history' in context:
-            query_parts.append("dialogue risk assessment")
-        
-        return " ".join(query_parts) if query_parts else "authorized scam risk assessment"
+        # At most two fixed phrases, so pick the whole query instead of joining parts
+        txn = context.get('transaction')
+        has_dialogue = 'dialogue_history' in context
+        if isinstance(txn, dict):
+            if has_dialogue:
+                return f"transaction risk assessment {txn.get('amount', 0)} dialogue risk assessment"
+            return f"transaction risk assessment {txn.get('amount', 0)}"
+        if has_dialogue:
+            return "dialogue risk assessment"
+        return "authorized scam risk assessment"
+
+    def sop_query(self, context: Dict[str, Any]) -> str:
+        """The SOP query assess_risk will issue for this context"""
+        return self._build_risk_assessment_query(context)
 
     def _retrieve_sop(self, context, query=None):
-        # Dynamic RAG: use vector search if query provided
-        if query:
-            hits = search_similar(query, top_k=3)
-            return [hit['text'] if isinstance(hit, dict) and 'text' in hit else str(hit) for hit in hits]
-        # Fallback: simple keyword search over SOP.md
-        sops = []
-        try:
-            with open('datasets/SOP.md', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        sops.append(line.strip())
-        except Exception as e:
-            self.logger.error(f"Error reading SOP file: {str(e)}")
-        return sops
+        return retrieve_sop(context, query=query, logger=self.logger)
 
     def _build_dialogue_summary(self, context: Dict[str, Any]) -> str:
         """Build intelligent compressed dialogue summary"""
@@ -162,37 +251,25 @@ class RiskAssessorAgent(Agent):
             ])
         else:
             # For longer dialogues, create compressed summary
-            key_points = []
-            facts_extracted = []
-            red_flags = []
-            
+            # Signals accumulate in a set bounded by the seven labels, one answer at a time
+            signals = set()
             for turn in dialogue_history:
-                if isinstance(turn, dict):
-                    question = turn.get('question', '').lower()
-                    answer = turn.get('user', '').lower()
-                    
-                    # Extract key information
-                    if 'authorize' in answer or 'confirm' in answer:
-                        facts_extracted.append("Customer authorized transaction")
-                    if 'scam' in answer or 'fraud' in answer:
-                        red_flags.append("Customer mentioned scam/fraud")
-                    if 'pressure' in answer or 'urgent' in answer:
-                        red_flags.append("Pressure/urgency tactics detected")
-                    if 'unknown' in answer or 'stranger' in answer:
-                        red_flags.append("Unknown/stranger relationship")
-                    if 'investment' in answer or 'return' in answer:
-                        facts_extracted.append("Investment-related transaction")
-                    if 'romance' in answer or 'relationship' in answer:
-                        facts_extracted.append("Romance/relationship context")
-                    if 'tech support' in answer or 'computer' in answer:
-                        facts_extracted.append("Tech support scenario")
+                if not isinstance(turn, dict):
+                    continue
+                for keywords in DIALOGUE_KEYWORDS.iter_matches(turn.get('user', '').lower()):
+                    signals.update(DIALOGUE_SIGNAL_OF[keyword] for keyword in keywords)
+                # Long dialogues usually raise every signal early; later answers can't add one
+                if len(signals) == DIALOGUE_SIGNAL_COUNT:
+                    break
+            facts_extracted = [fact for fact in DIALOGUE_FACTS if fact in signals]
+            red_flags = [flag for flag in DIALOGUE_RED_FLAGS if flag in signals]
             
             # Build compressed summary
             summary_parts = []
             if facts_extracted:
-                summary_parts.append(f"FACTS: {', '.join(set(facts_extracted))}")
+                summary_parts.append(f"FACTS: {', '.join(facts_extracted)}")
             if red_flags:
-                summary_parts.append(f"RED FLAGS: {', '.join(set(red_flags))}")
+                summary_parts.append(f"RED FLAGS: {', '.join(red_flags)}")
             summary_parts.append(f"TURNS: {len(dialogue_history)}")
             
             dialogue_summary = " | ".join(summary_parts)
@@ -201,96 +278,42 @@ class RiskAssessorAgent(Agent):
 
     def _build_final_assessment_prompt(self, context: Dict[str, Any], dialogue_summary: str, sops: List[str]) -> str:
         """Build intelligent final assessment prompt with COMPRESSED AGENT LOGS"""
-        specialized_prompts = self.agent_config.specialized_prompts
-        
-        final_determination_prompt = specialized_prompts.get('final_determination',
-            "Make final scam determination based on complete investigation")
-        
         # Build SOP summary
         sop_summary = "\n".join(sops[:3]) if sops else "No specific SOPs found"
         
         # Get compressed agent logs
         compressed_agent_logs = context.get('compressed_agent_logs', 'AGENT LOGS: Not available')
         
-        # Provide explicit, deterministic rubric to avoid "insufficient data" when gate already passed
-        prompt = f"""
-You are an expert risk assessor specializing in authorized payment scams (APP fraud).
-
-{final_determination_prompt}
-
-Assume dialogue context is sufficient (expert gate passed). Use the rubric below and avoid stating that data is insufficient.
-
-COMPRESSED AGENT LOGS:
-{compressed_agent_logs}
-
-COMPLETE CUSTOMER DIALOGUE (compressed):
-{dialogue_summary}
-
-RELEVANT SOPs:
-{sop_summary}
-
-RUBRIC:
-- If remote access tools (AnyDesk/TeamViewer), OTP/code sharing, and impersonation of bank staff are present → Authorized Scam = Yes, Confidence = High.
-- If caller provided PayID/instructions and urgency/secrecy present → Authorized Scam = Yes, Confidence = High.
-- If relationship is verified, no social engineering, and legitimate invoice context → consider No or Medium with justification.
-
-OUTPUT (STRICT):
-1) AUTHORIZED_SCAM: Yes/No
-2) CONFIDENCE: High/Medium/Low
-3) INDICATORS: bullet list
-4) RED_FLAGS: bullet list
-5) ACTIONS: bullet list (customer protection + operational)
-6) TYPOLOGY: one of [business_email_compromise, impersonation, tech_support, romance, investment, purchase, other]
-"""
-        return prompt
+        return FINAL_ASSESSMENT_PROMPT_TEMPLATE.format(
+            final_determination_prompt=self._final_determination_prompt,
+            compressed_agent_logs=compressed_agent_logs,
+            dialogue_summary=dialogue_summary,
+            sop_summary=sop_summary,
+        )
 
-    def _build_progressive_assessment_prompt(self, context: Dict[str, Any], dialogue_summary: str, sops: List[str]) -> str:
+    def _build_progressive_assessment_prompt(self, context: Dict[str, Any], dialogue_summary: str, sops: List[str],
+                                             compressed_context: str, compressed_risk: str) -> str:
         """Build intelligent progressive assessment prompt with COMPRESSED CONTEXT"""
-        specialized_prompts = self.agent_config.specialized_prompts
-        
-        progressive_prompt = specialized_prompts.get('progressive_assessment',
-            "Evaluate the CURRENT state of the investigation based on dialogue progress")
-        
         # COMPRESSED CONTEXT SUMMARIES
-        compressed_context = self._build_compressed_context_summary(context)
-        compressed_risk = self._build_compressed_risk_summary(context)
         compressed_triage = self._build_compressed_triage_summary(context)
         
         # OPTIMIZATION: Use only first 2 SOPs for speed
         sop_summary = "\n".join(sops[:2]) if sops else "No specific SOPs found"
         
-        # EXPERT-LEVEL COMPRESSED PROMPT
-        prompt = f"""
-XYZ Bank Expert Risk Assessment - COMPRESSED CONTEXT
-
-{compressed_context}
-{compressed_risk}
-{compressed_triage}
-
-DIALOGUE SUMMARY: {dialogue_summary}
-RELEVANT SOPs: {sop_summary[:180]}...
-
-EXPERT ASSESSMENT (SHORT BULLETS):
-- Risk Level: [HIGH/MEDIUM/LOW]
-- Scam Typology: [Type or None]
-- Sufficient Info: [Yes/No]
-- Next Action: [Ask <1 best question>/Finalize/Escalate]
-- Key Missing: [If any]
-
-IMPORTANT: If remote access, code sharing, and impersonation are detected, set Sufficient Info = Yes and recommend FINALIZE with High risk.
-If information is borderline, return exactly ONE targeted question that would unlock finalization.
-"""
-        return prompt
+        return PROGRESSIVE_ASSESSMENT_PROMPT_TEMPLATE.format(
+            compressed_context=compressed_context,
+            compressed_risk=compressed_risk,
+            compressed_triage=compressed_triage,
+            dialogue_summary=dialogue_summary,
+            sop_summary=sop_summary[:180],
+        )
 
     def _get_expert_assessment(self, prompt: str) -> str:
         """Get expert assessment with error handling"""
         try:
-            result = "".join([token for token in converse_with_claude_stream([
-                {"role": "user", "content": [{"text": prompt}]}
-                ], max_tokens=self.agent_config.max_tokens)])
-            return result
+            return stream_completion(prompt, self.agent_config.max_tokens)
         except Exception as e:
-            self.logger.error(f"Failed to get expert assessment: {e}")
+            self.logger.error("Failed to get expert assessment: %s", e)
             return "Risk assessment unavailable due to technical issues"
 
     def _build_compressed_context_summary(self, context: Dict[str, Any]) -> str:
@@ -323,18 +346,12 @@ If information is borderline, return exactly ONE targeted question that would un
         # Key indicators from context
         indicators = []
         if context.get('transaction_context'):
-            txn_text = context['transaction_context'].lower()
-            if 'verified' in txn_text:
-                indicators.append("VERIFIED")
-            if 'suspicious' in txn_text:
-                indicators.append("SUSPICIOUS")
+            found = TRANSACTION_INDICATOR_KEYWORDS.findall(cached_lower(context, 'transaction_context'))
+            indicators.extend(label for label, keyword in TRANSACTION_INDICATORS.items() if keyword in found)
         
         if context.get('customer_context'):
-            cust_text = context['customer_context'].lower()
-            if 'high-risk' in cust_text:
-                indicators.append("HIGH-RISK")
-            if 'vulnerable' in cust_text:
-                indicators.append("VULNERABLE")
+            found = CUSTOMER_INDICATOR_KEYWORDS.findall(cached_lower(context, 'customer_context'))
+            indicators.extend(label for label, keyword in CUSTOMER_INDICATORS.items() if keyword in found)
         
         if indicators:
             summary_parts.append(f"INDICATORS: {', '.join(indicators)}")
@@ -347,20 +364,12 @@ If information is borderline, return exactly ONE targeted question that would un
         
         # Risk synthesis
         if context.get('risk_summary_context'):
-            risk_text = context['risk_summary_context'].lower()
-            risk_level = "HIGH" if "high" in risk_text else "MEDIUM" if "medium" in risk_text else "LOW"
+            found = RISK_SUMMARY_KEYWORDS.findall(cached_lower(context, 'risk_summary_context'))
+            risk_level = "HIGH" if "high" in found else "MEDIUM" if "medium" in found else "LOW"
             summary_parts.append(f"RISK: {risk_level}")
             
             # Extract key risk factors
-            risk_factors = []
-            if 'scam' in risk_text:
-                risk_factors.append("SCAM")
-            if 'fraud' in risk_text:
-                risk_factors.append("FRAUD")
-            if 'suspicious' in risk_text:
-                risk_factors.append("SUSPICIOUS")
-            if 'anomaly' in risk_text:
-                risk_factors.append("ANOMALY")
+            risk_factors = [label for label, keyword in RISK_FACTORS.items() if keyword in found]
             
             if risk_factors:
                 summary_parts.append(f"FACTORS: {', '.join(risk_factors)}")
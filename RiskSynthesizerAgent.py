@@ -1,28 +1,101 @@
 from strands import Agent, tool
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import json
-from datetime import datetime
-from aws_bedrock import converse_with_claude_stream
 from config import config
-from vector_utils import search_similar
+from agent_utils import IndicatorTiers, KeywordMatcher, cached_lower, now_iso, retrieve_sop, stream_completion
 import logging
-import yaml
 
-def load_fraud_yaml_blocks(filepath):
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-    blocks = content.split('---')
-    parsed = []
-    for block in blocks:
-        block = block.strip()
-        if block:
-            try:
-                loaded = yaml.safe_load(block)
-                if isinstance(loaded, dict):  # Only keep dicts
-                    parsed.append(loaded)
-            except Exception:
-                continue
-    return parsed
+# Context fields whose text feeds the heuristic typology detectors
+SIGNAL_CONTEXT_FIELDS = ['transaction_context', 'customer_context', 'merchant_context', 'anomaly_context', 'risk_summary_context']
+
+# BEC indicator -> phrases that raise it; two or more indicators flag BEC
+BEC_INDICATORS = {
+    'vendor_name_manipulation': ['name was slightly different', 'abbreviat', ' nt electrical', 'vendor name change', 'altered name'],
+    'duplicate_invoice': ['duplicate invoice', 'inv#', 'invoice redirection'],
+    'bank_details_change': ['new bank account', 'changed bank details', 'new account details', 'updated banking details'],
+    'email_channel_request': ['came via email', 'email request', 'via email'],
+    'supplier_impersonation': ['vendor impersonation', 'impersonation', 'supplier impersonation'],
+}
+
+# Other typologies in detection order: flag -> phrases; two or more flags detect the typology
+TYPOLOGY_FLAGS = {
+    'tech_support_scam': {
+        'remote_access': ['remote access', 'anydesk', 'teamviewer', 'screen sharing'],
+        'tech_support_terms': ['tech support', 'technical support', 'virus', 'malware'],
+        'codes_asked': ['otp', 'one-time password', 'security code'],
+    },
+    'investment_scam': {
+        'investment_terms': ['investment', 'crypto', 'trading', 'platform'],
+        'guaranteed_returns': ['guaranteed', 'high returns', 'promised returns'],
+        'pressure': ['urgent', 'pressure', 'limited time'],
+    },
+    'romance_scam': {
+        'relationship_terms': ['romance', 'relationship', 'boyfriend', 'girlfriend', 'love'],
+        'secrecy': ['keep this secret', 'dont tell', 'secrecy'],
+        'emergency_money': ['emergency', 'travel money', 'medical expenses'],
+    },
+    'impersonation_scam': {
+        'authority_terms': ['bank official', 'bank security department', 'police', 'government', 'ato'],
+        'threats': ['legal action', 'arrest', 'freeze'],
+        'secrecy': ['keep this secret', 'do not tell'],
+    },
+    'purchase_scam': {
+        'marketplace': ['marketplace', 'online purchase', 'seller'],
+        'unusual_payment': ['gift card', 'crypto payment', 'unusual payment method'],
+        'too_good': ['too good to be true', 'unrealistic price'],
+    },
+}
+
+# Typology named in a synthesis -> its indicators, first match wins
+SCAM_TYPOLOGY_INDICATORS = {
+    'business_email_compromise': ['bec', 'business email compromise', 'vendor impersonation', 'invoice redirection'],
+    'romance_scam': ['romance', 'relationship', 'emotional manipulation', 'love scam'],
+    'investment_scam': ['investment', 'returns', 'crypto', 'trading', 'investment opportunity'],
+    'tech_support_scam': ['tech support', 'computer virus', 'remote access', 'technical issue'],
+    'impersonation_scam': ['impersonation', 'government', 'bank official', 'authority'],
+    'purchase_scam': ['purchase', 'buying', 'seller', 'marketplace', 'online purchase'],
+}
+
+# Each vocabulary compiles into one matcher so every text is scanned once
+BEC_KEYWORDS = KeywordMatcher(k for keywords in BEC_INDICATORS.values() for k in keywords)
+TYPOLOGY_KEYWORDS = KeywordMatcher(k for flags in TYPOLOGY_FLAGS.values() for keywords in flags.values() for k in keywords)
+SCAM_TYPOLOGY_KEYWORDS = KeywordMatcher(k for keywords in SCAM_TYPOLOGY_INDICATORS.values() for k in keywords)
+
+TEXT_SCORE_TIERS = IndicatorTiers([
+    (['scam', 'fraud', 'impersonation', 'phishing', 'remote access', 'anydesk', 'teamviewer'], 0.3),
+    (['urgent', 'pressure', 'secrecy', 'code', 'otp', 'security code'], 0.2),
+    (['verified relationship', 'known recipient', 'legitimate invoice'], -0.2),
+])
+
+# Static role and specialized prompts, sent as the system prompt
+SYNTHESIS_SYSTEM_TEMPLATE = """
+You are a risk synthesizer agent specializing in comprehensive fraud analysis.
+
+{risk_synthesis_prompt}
+{scam_typology_prompt}
+"""
+
+SYNTHESIS_PROMPT_TEMPLATE = """
+CONTEXT SUMMARIES:
+Transaction Context: {txn}
+Customer Context: {cust}
+Merchant Context: {merch}
+Behavioral/Anomaly Context: {anom}
+
+RELEVANT SOPs:
+{sop_summary}
+
+SYNTHESIS REQUIREMENTS:
+1. Analyze all context summaries and identify key risk factors
+2. Identify specific fraud typologies (BEC, romance scams, investment scams, etc.)
+3. Assess compliance triggers and regulatory requirements
+4. Provide clear risk rating (LOW/MEDIUM/HIGH) with confidence level
+5. Recommend immediate actions and escalation requirements
+6. Consider customer vulnerability and protection measures
+7. Identify scam indicators and social engineering tactics
+
+Provide a concise, expert-level risk synthesis for fraud operations.
+"""
 
 class RiskSynthesizerAgent(Agent):
     def __init__(self):
@@ -33,69 +106,55 @@ class RiskSynthesizerAgent(Agent):
         )
         self.agent_config = config.get_agent_config(self.name)
         self.logger = logging.getLogger(self.name)
+        
+        # Resolve specialized prompts once; they don't change per case
+        specialized_prompts = self.agent_config.specialized_prompts
+        risk_synthesis_prompt = specialized_prompts.get('risk_synthesis',
+            "Synthesize comprehensive risk assessment from multiple sources")
+        scam_typology_prompt = specialized_prompts.get('scam_typology',
+            "Identify specific scam typologies and fraud patterns")
+        self._system_prompt = SYNTHESIS_SYSTEM_TEMPLATE.format(
+            risk_synthesis_prompt=risk_synthesis_prompt,
+            scam_typology_prompt=scam_typology_prompt,
+        )
 
     @tool
     def synthesize_risk(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """Synthesize risk assessment from multiple agent contexts and identify fraud typologies."""
         try:
-            # Get dynamic SOPs based on risk context
-            risk_query = self._build_risk_query(context)
-            sops = self._retrieve_sop(context, query=risk_query)
+            # The heuristics only read the agent contexts, so they run first and can stand in for the model
+            detections = self._apply_typology_heuristics(context)
+            result = self._short_circuit_synthesis(detections)
+            if result is None:
+                # Get dynamic SOPs based on risk context
+                risk_query = self._build_risk_query(context)
+                sops = self._retrieve_sop(context, query=risk_query)
+                
+                # Get all context summaries
+                txn = context.get('transaction_context', '[unavailable]')
+                cust = context.get('customer_context', '[unavailable]')
+                merch = context.get('merchant_context', '[unavailable]')
+                anom = context.get('anomaly_context', '[unavailable]')
+                
+                # Build intelligent synthesis prompt
+                prompt = self._build_risk_synthesis_prompt(txn, cust, merch, anom, sops)
+                
+                # Get expert synthesis
+                result = self._get_expert_synthesis(prompt)
             
-            # Get all context summaries
-            txn = context.get('transaction_context', '[unavailable]')
-            cust = context.get('customer_context', '[unavailable]')
-            merch = context.get('merchant_context', '[unavailable]')
-            anom = context.get('anomaly_context', '[unavailable]')
+            for label, flags in detections:
+                result = (result or '') + f"\n\nIndicators: {label} pattern detected: " + ", ".join(flags)
             
-            # Build intelligent synthesis prompt
-            prompt = self._build_risk_synthesis_prompt(txn, cust, merch, anom, sops)
-            
-            # Get expert synthesis
-            result = self._get_expert_synthesis(prompt)
-            
-            # Heuristic BEC detection to reinforce typology and accelerate convergence
-            try:
-                bec_ind = self._detect_bec_indicators(context)
-                if bec_ind.get('bec_detected'):
-                    result = (result or '') + "\n\nIndicators: Business Email Compromise (BEC) pattern detected: " + \
-                             ", ".join(sorted([k for k, v in bec_ind.items() if isinstance(v, bool) and v and k != 'bec_detected']))
-                    context['scam_typology'] = 'business_email_compromise'
-                    context['overall_risk_score'] = float(max(float(context.get('overall_risk_score') or 0.0), 0.9))
-                    context['risk_confidence'] = float(max(float(context.get('risk_confidence') or 0.7), 0.85))
-                    context['bec_indicators'] = bec_ind
-                    context['risk_ready_to_finalize'] = True
-            except Exception:
-                pass
-
-            # Heuristic detection for other typologies to accelerate convergence
-            try:
-                if context.get('scam_typology') not in ('business_email_compromise',):
-                    typ_ind = self._detect_other_typologies(context)
-                    if typ_ind.get('detected') and typ_ind.get('typology'):
-                        tname = typ_ind['typology']
-                        result = (result or '') + f"\n\nIndicators: {tname.replace('_', ' ').title()} pattern detected: " + \
-                                 ", ".join(sorted([k for k, v in typ_ind.get('flags', {}).items() if v]))
-                        context['scam_typology'] = tname
-                        # Calibrate scores per typology
-                        base_score = 0.85 if tname in ('investment_scam', 'impersonation_scam', 'romance_scam') else 0.75
-                        context['overall_risk_score'] = float(max(float(context.get('overall_risk_score') or 0.0), base_score))
-                        context['risk_confidence'] = float(max(float(context.get('risk_confidence') or 0.6), 0.8))
-                        context['typology_indicators'] = typ_ind
-                        # Early finalization for strong signals
-                        context['risk_ready_to_finalize'] = True
-            except Exception:
-                pass
-            
-            # Add to context with metadata
+            # Add to context with metadata; risk_synthesis is kept as an alias of the summary
             context['risk_summary_context'] = result
-            context['risk_synthesis_timestamp'] = datetime.now().isoformat()
+            context['risk_synthesis'] = result
+            context['risk_synthesis_timestamp'] = now_iso()
             
             # Compute weighted factor scores to feed downstream XAI and policy
-            tx_score = self._score_text(context.get('transaction_context', ''))
-            cu_score = self._score_text(context.get('customer_context', ''))
-            me_score = self._score_text(context.get('merchant_context', ''))
-            be_score = self._score_text(context.get('anomaly_context', ''))
+            tx_score = self._score_text(context.get('transaction_context', ''), cached_lower(context, 'transaction_context'))
+            cu_score = self._score_text(context.get('customer_context', ''), cached_lower(context, 'customer_context'))
+            me_score = self._score_text(context.get('merchant_context', ''), cached_lower(context, 'merchant_context'))
+            be_score = self._score_text(context.get('anomaly_context', ''), cached_lower(context, 'anomaly_context'))
             weights = {'transaction': 0.35, 'customer': 0.25, 'merchant': 0.15, 'behavioral': 0.25}
             risk_score = (
                 weights['transaction'] * tx_score +
@@ -113,10 +172,6 @@ class RiskSynthesizerAgent(Agent):
             context['overall_risk_score'] = float(max(0.0, min(1.0, risk_score)))
             context['scam_typology'] = self._identify_scam_typology(result)
             
-            # Add to context with metadata
-            context['risk_synthesis'] = result
-            context['risk_synthesis_timestamp'] = datetime.now().isoformat()
-            
             self.logger.info(f"Risk synthesis completed for case: {context.get('transaction', {}).get('alert_id', 'Unknown')}")
             return context
         except Exception as e:
@@ -124,92 +179,97 @@ class RiskSynthesizerAgent(Agent):
             context['risk_synthesis_error'] = str(e)
             return context
 
-    def _detect_bec_indicators(self, context: Dict[str, Any]) -> Dict[str, Any]:
-        """Simple heuristic BEC detection from context and dialogue text"""
-        text_parts = []
-        for key in ['transaction_context', 'customer_context', 'merchant_context', 'anomaly_context', 'risk_summary_context']:
-            val = context.get(key)
-            if isinstance(val, str):
-                text_parts.append(val.lower())
-        dh = context.get('dialogue_history') or []
-        for turn in dh:
-            if isinstance(turn, dict) and turn.get('user'):
-                text_parts.append(str(turn.get('user')).lower())
-        blob = " \n".join(text_parts)
-        indicators = {
-            'vendor_name_manipulation': any(s in blob for s in ['name was slightly different', 'abbreviat', ' nt electrical', 'vendor name change', 'altered name']),
-            'duplicate_invoice': any(s in blob for s in ['duplicate invoice', 'inv#', 'invoice redirection']),
-            'bank_details_change': any(s in blob for s in ['new bank account', 'changed bank details', 'new account details', 'updated banking details']),
-            'email_channel_request': any(s in blob for s in ['came via email', 'email request', 'via email']),
-            'supplier_impersonation': any(s in blob for s in ['vendor impersonation', 'impersonation', 'supplier impersonation'])
-        }
-        score = sum(1 for v in indicators.values() if v)
-        indicators['bec_detected'] = score >= 2
-        return indicators
+    def _apply_typology_heuristics(self, context: Dict[str, Any]) -> List[Tuple[str, List[str]]]:
+        """Record heuristic typology detections in context; returns (pattern label, matched flags) for each"""
+        detections = []
+        
+        # Heuristic BEC detection to reinforce typology and accelerate convergence
+        try:
+            bec_ind = self._detect_bec_indicators(context)
+            if bec_ind.get('bec_detected'):
+                detections.append(("Business Email Compromise (BEC)",
+                                   sorted([k for k, v in bec_ind.items() if isinstance(v, bool) and v and k != 'bec_detected'])))
+                context['scam_typology'] = 'business_email_compromise'
+                context['overall_risk_score'] = float(max(float(context.get('overall_risk_score') or 0.0), 0.9))
+                context['risk_confidence'] = float(max(float(context.get('risk_confidence') or 0.7), 0.85))
+                context['bec_indicators'] = bec_ind
+                context['risk_ready_to_finalize'] = True
+        except Exception:
+            pass
 
-    def _detect_other_typologies(self, context: Dict[str, Any]) -> Dict[str, Any]:
-        text_parts = []
-        for key in ['transaction_context', 'customer_context', 'merchant_context', 'anomaly_context', 'risk_summary_context']:
-            val = context.get(key)
-            if isinstance(val, str):
-                text_parts.append(val.lower())
+        # Heuristic detection for other typologies to accelerate convergence
+        try:
+            if context.get('scam_typology') not in ('business_email_compromise',):
+                typ_ind = self._detect_other_typologies(context)
+                if typ_ind.get('detected') and typ_ind.get('typology'):
+                    tname = typ_ind['typology']
+                    detections.append((tname.replace('_', ' ').title(),
+                                       sorted([k for k, v in typ_ind.get('flags', {}).items() if v])))
+                    context['scam_typology'] = tname
+                    # Calibrate scores per typology
+                    base_score = 0.85 if tname in ('investment_scam', 'impersonation_scam', 'romance_scam') else 0.75
+                    context['overall_risk_score'] = float(max(float(context.get('overall_risk_score') or 0.0), base_score))
+                    context['risk_confidence'] = float(max(float(context.get('risk_confidence') or 0.6), 0.8))
+                    context['typology_indicators'] = typ_ind
+                    # Early finalization for strong signals
+                    context['risk_ready_to_finalize'] = True
+        except Exception:
+            pass
+        
+        return detections
+
+    def _short_circuit_synthesis(self, detections: List[Tuple[str, List[str]]]) -> Optional[str]:
+        """Templated synthesis when a heuristic pattern matched enough flags, or None to ask the model"""
+        if not config.environment['SYNTHESIS_LLM_SHORTCIRCUIT']:
+            return None
+        min_flags = config.environment['SYNTHESIS_SHORTCIRCUIT_MIN_FLAGS']
+        strong = [label for label, flags in detections if len(flags) >= min_flags]
+        if not strong:
+            return None
+        # The pattern label and flags appended after this header carry the typology keywords
+        return "\n".join([
+            "RISK SYNTHESIS: HIGH RISK",
+            f"JUSTIFICATION: Automatic synthesis - {'; '.join(strong)} pattern matched at least {min_flags} heuristic indicators",
+            "RECOMMENDATION: Finalize the risk assessment and hold the payment pending customer contact through a verified channel",
+        ])
+
+    def _signal_texts(self, context: Dict[str, Any], include_questions: bool) -> List[str]:
+        """Lowercased context fields and dialogue turns the typology detectors scan"""
+        # Context fields share their lowercase copies with the other scorers through cached_lower
+        texts = [cached_lower(context, key) for key in SIGNAL_CONTEXT_FIELDS if isinstance(context.get(key), str)]
         dh = context.get('dialogue_history') or []
         for turn in dh:
             if isinstance(turn, dict):
                 if turn.get('user'):
-                    text_parts.append(str(turn.get('user')).lower())
-                if turn.get('question'):
-                    text_parts.append(str(turn.get('question')).lower())
-        blob = " \n".join(text_parts)
-
-        def has_any(keywords: List[str]) -> bool:
-            return any(k in blob for k in keywords)
+                    texts.append(str(turn.get('user')).lower())
+                if include_questions and turn.get('question'):
+                    texts.append(str(turn.get('question')).lower())
+        return texts
 
-        # Tech support scam
-        tech_flags = {
-            'remote_access': has_any(['remote access', 'anydesk', 'teamviewer', 'screen sharing']),
-            'tech_support_terms': has_any(['tech support', 'technical support', 'virus', 'malware']),
-            'codes_asked': has_any(['otp', 'one-time password', 'security code']),
-        }
-        if sum(1 for v in tech_flags.values() if v) >= 2:
-            return {'detected': True, 'typology': 'tech_support_scam', 'flags': tech_flags}
+    @staticmethod
+    def _find_keywords(matcher: KeywordMatcher, texts: List[str]) -> set:
+        # No phrase contains a newline, so scanning the pieces apart matches the old newline-joined blob
+        found = set()
+        for text in texts:
+            found |= matcher.findall(text)
+        return found
 
-        # Investment scam
-        invest_flags = {
-            'investment_terms': has_any(['investment', 'crypto', 'trading', 'platform']),
-            'guaranteed_returns': has_any(['guaranteed', 'high returns', 'promised returns']),
-            'pressure': has_any(['urgent', 'pressure', 'limited time']),
-        }
-        if sum(1 for v in invest_flags.values() if v) >= 2:
-            return {'detected': True, 'typology': 'investment_scam', 'flags': invest_flags}
-
-        # Romance scam
-        romance_flags = {
-            'relationship_terms': has_any(['romance', 'relationship', 'boyfriend', 'girlfriend', 'love']),
-            'secrecy': has_any(['keep this secret', 'dont tell', 'secrecy']),
-            'emergency_money': has_any(['emergency', 'travel money', 'medical expenses']),
-        }
-        if sum(1 for v in romance_flags.values() if v) >= 2:
-            return {'detected': True, 'typology': 'romance_scam', 'flags': romance_flags}
-
-        # Impersonation scam
-        imp_flags = {
-            'authority_terms': has_any(['bank official', 'bank security department', 'police', 'government', 'ato']),
-            'threats': has_any(['legal action', 'arrest', 'freeze']),
-            'secrecy': has_any(['keep this secret', 'do not tell']),
-        }
-        if sum(1 for v in imp_flags.values() if v) >= 2:
-            return {'detected': True, 'typology': 'impersonation_scam', 'flags': imp_flags}
-
-        # Purchase scam
-        purch_flags = {
-            'marketplace': has_any(['marketplace', 'online purchase', 'seller']),
-            'unusual_payment': has_any(['gift card', 'crypto payment', 'unusual payment method']),
-            'too_good': has_any(['too good to be true', 'unrealistic price']),
+    def _detect_bec_indicators(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Simple heuristic BEC detection from context and dialogue text"""
+        found = self._find_keywords(BEC_KEYWORDS, self._signal_texts(context, include_questions=False))
+        indicators = {
+            indicator: not found.isdisjoint(keywords) for indicator, keywords in BEC_INDICATORS.items()
         }
-        if sum(1 for v in purch_flags.values() if v) >= 2:
-            return {'detected': True, 'typology': 'purchase_scam', 'flags': purch_flags}
+        score = sum(1 for v in indicators.values() if v)
+        indicators['bec_detected'] = score >= 2
+        return indicators
 
+    def _detect_other_typologies(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        found = self._find_keywords(TYPOLOGY_KEYWORDS, self._signal_texts(context, include_questions=True))
+        for typology, flag_keywords in TYPOLOGY_FLAGS.items():
+            flags = {flag: not found.isdisjoint(keywords) for flag, keywords in flag_keywords.items()}
+            if sum(1 for v in flags.values() if v) >= 2:
+                return {'detected': True, 'typology': typology, 'flags': flags}
         return {'detected': False}
 
     def _build_risk_query(self, context: Dict[str, Any]) -> str:
@@ -234,69 +294,25 @@ class RiskSynthesizerAgent(Agent):
         return " ".join(query_parts) if query_parts else "comprehensive risk assessment"
 
     def _retrieve_sop(self, context, query=None):
-        # Dynamic RAG: use vector search if query provided
-        if query:
-            hits = search_similar(query, top_k=3)
-            return [hit['text'] if isinstance(hit, dict) and 'text' in hit else str(hit) for hit in hits]
-        # Fallback: simple keyword search over SOP.md
-        sops = []
-        try:
-            with open('datasets/SOP.md', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        sops.append(line.strip())
-        except Exception as e:
-            self.logger.error(f"Error reading SOP file: {str(e)}")
-        return sops
+        return retrieve_sop(context, query=query, logger=self.logger)
 
     def _build_risk_synthesis_prompt(self, txn: str, cust: str, merch: str, anom: str, sops: List[str]) -> str:
         """Build intelligent risk synthesis prompt"""
-        specialized_prompts = self.agent_config.specialized_prompts
-        
-        risk_synthesis_prompt = specialized_prompts.get('risk_synthesis',
-            "Synthesize comprehensive risk assessment from multiple sources")
-        
-        scam_typology_prompt = specialized_prompts.get('scam_typology',
-            "Identify specific scam typologies and fraud patterns")
-        
         # Build SOP summary
         sop_summary = "\n".join(sops[:5]) if sops else "No specific SOPs found"
         
-        prompt = f"""
-You are a risk synthesizer agent specializing in comprehensive fraud analysis.
-
-{risk_synthesis_prompt}
-{scam_typology_prompt}
-
-CONTEXT SUMMARIES:
-Transaction Context: {txn}
-Customer Context: {cust}
-Merchant Context: {merch}
-Behavioral/Anomaly Context: {anom}
-
-RELEVANT SOPs:
-{sop_summary}
-
-SYNTHESIS REQUIREMENTS:
-1. Analyze all context summaries and identify key risk factors
-2. Identify specific fraud typologies (BEC, romance scams, investment scams, etc.)
-3. Assess compliance triggers and regulatory requirements
-4. Provide clear risk rating (LOW/MEDIUM/HIGH) with confidence level
-5. Recommend immediate actions and escalation requirements
-6. Consider customer vulnerability and protection measures
-7. Identify scam indicators and social engineering tactics
-
-Provide a concise, expert-level risk synthesis for fraud operations.
-"""
-        return prompt
+        return SYNTHESIS_PROMPT_TEMPLATE.format(
+            txn=txn,
+            cust=cust,
+            merch=merch,
+            anom=anom,
+            sop_summary=sop_summary,
+        )
 
     def _get_expert_synthesis(self, prompt: str) -> str:
         """Get expert synthesis with error handling"""
         try:
-            result = "".join([token for token in converse_with_claude_stream([
-                {"role": "user", "content": [{"text": prompt}]}
-            ], max_tokens=self.agent_config.max_tokens)])
-            return result
+            return stream_completion(prompt, self.agent_config.max_tokens, system=self._system_prompt)
         except Exception as e:
             self.logger.error(f"Failed to get expert synthesis: {e}")
             return "Risk synthesis unavailable due to technical issues"
@@ -327,39 +343,21 @@ Provide a concise, expert-level risk synthesis for fraud operations.
         
         return 0.5  # Default medium risk
 
-    def _score_text(self, text: str) -> float:
+    def _score_text(self, text: str, text_lower: Optional[str] = None) -> float:
         """Heuristic scoring from context text for weighted aggregation."""
         if not isinstance(text, str) or not text:
             return 0.5
-        t = text.lower()
-        score = 0.5
-        if any(k in t for k in ['scam', 'fraud', 'impersonation', 'phishing', 'remote access', 'anydesk', 'teamviewer']):
-            score += 0.3
-        if any(k in t for k in ['urgent', 'pressure', 'secrecy', 'code', 'otp', 'security code']):
-            score += 0.2
-        if any(k in t for k in ['verified relationship', 'known recipient', 'legitimate invoice']):
-            score -= 0.2
-        return float(max(0.0, min(1.0, score)))
+        t = text_lower if text_lower is not None else text.lower()
+        return float(TEXT_SCORE_TIERS.score(t))
 
     def _identify_scam_typology(self, result: str) -> Optional[str]:
         """Identify scam typology from synthesis"""
         if not result:
             return None
         
-        result_lower = result.lower()
-        
-        # Scam typology indicators
-        typology_indicators = {
-            'business_email_compromise': ['bec', 'business email compromise', 'vendor impersonation', 'invoice redirection'],
-            'romance_scam': ['romance', 'relationship', 'emotional manipulation', 'love scam'],
-            'investment_scam': ['investment', 'returns', 'crypto', 'trading', 'investment opportunity'],
-            'tech_support_scam': ['tech support', 'computer virus', 'remote access', 'technical issue'],
-            'impersonation_scam': ['impersonation', 'government', 'bank official', 'authority'],
-            'purchase_scam': ['purchase', 'buying', 'seller', 'marketplace', 'online purchase']
-        }
-        
-        for typology, indicators in typology_indicators.items():
-            if any(indicator in result_lower for indicator in indicators):
+        found = SCAM_TYPOLOGY_KEYWORDS.findall(result.lower())
+        for typology, indicators in SCAM_TYPOLOGY_INDICATORS.items():
+            if not found.isdisjoint(indicators):
                 return typology
         
         return None
@@ -2,7 +2,6 @@ from strands import Agent, tool
 from typing import Dict, Any, List, Tuple
 import concurrent.futures
 from datetime import datetime
-from aws_bedrock import converse_with_claude_stream
 from config import config
 from vector_utils import search_similar
 import logging
@@ -17,10 +16,35 @@ from DialogueAgent import dialogue_agent
 from RiskAssessorAgent import risk_assessor_agent
 from PolicyDecisionAgent import policy_decision_agent
 from FeedbackCollectorAgent import feedback_collector_agent
+from agent_utils import prefetch_sops, stream_completion
 
 from bedrock_agentcore import BedrockAgentCoreApp
 app = BedrockAgentCoreApp()
 
+# Static analyst role, sent as the system prompt
+FINAL_REPORT_SYSTEM_PROMPT = """
+You are a senior fraud analyst at XYZ Bank. Based on the following comprehensive investigation, provide a clear, professional final report.
+"""
+
+FINAL_REPORT_PROMPT_TEMPLATE = """
+INVESTIGATION CONTEXT:
+{context_summary}
+
+CUSTOMER CONVERSATION:
+{conversation_summary}
+
+REPORT REQUIREMENTS:
+1. Executive Summary: Key findings and decision
+2. Risk Assessment: Detailed risk analysis and factors
+3. Scam Typology: Specific scam type identified (if any)
+4. Customer Impact: Vulnerability assessment and protection measures
+5. Regulatory Compliance: AUSTRAC, APRA, and other requirements
+6. Recommendations: Immediate actions and follow-up steps
+7. Lessons Learned: System improvements and process enhancements
+
+Provide a comprehensive, professional report suitable for senior management and regulatory reporting.
+"""
+
 class SupervisorAgent(Agent):
     def __init__(self):
         super().__init__(
@@ -51,7 +75,12 @@ class SupervisorAgent(Agent):
             if context.get('dialogue_required', False):
                 context = self._run_dialogue_loop(context)
             
-            # Step 5: Run final risk assessment
+            # Step 5: Run final risk assessment; its SOPs, policy's and feedback's come from one batched search
+            prefetch_sops([
+                risk_assessor_agent.sop_query(context),
+                policy_decision_agent.sop_query(context),
+                feedback_collector_agent.sop_query(context),
+            ])
             context = risk_assessor_agent.assess_risk(context, is_final=True)
             
             # Step 6: Run policy decision
@@ -72,23 +101,30 @@ class SupervisorAgent(Agent):
         """Run context agents in parallel with intelligent error handling."""
         context_results = {}
         
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = {
-                'transaction': executor.submit(transaction_context_agent.analyze_transaction, context.copy()),
-                'customer': executor.submit(customer_info_agent.analyze_customer, context.copy()),
-                'merchant': executor.submit(merchant_info_agent.analyze_merchant, context.copy()),
-                'behavior': executor.submit(behavioral_pattern_agent.analyze_behavior, context.copy()),
-            }
-            
-            for key, future in futures.items():
-                try:
-                    result = future.result(timeout=30)  # 30 second timeout
-                    if isinstance(result, dict):
-                        context_results.update(result)
-                except Exception as e:
-                    self.logger.error(f"Context agent {key} failed: {e}")
-                    # Continue with other agents
-                    continue
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        futures = {
+            'transaction': executor.submit(transaction_context_agent.analyze_transaction, context.copy()),
+            'customer': executor.submit(customer_info_agent.analyze_customer, context.copy()),
+            'merchant': executor.submit(merchant_info_agent.analyze_merchant, context.copy()),
+            'behavior': executor.submit(behavioral_pattern_agent.analyze_behavior, context.copy()),
+        }
+        # One deadline for the whole fan-out rather than a timeout per agent in turn
+        concurrent.futures.wait(futures.values(), timeout=config.environment['REQUEST_TIMEOUT'])
+        
+        for key, future in futures.items():
+            if not future.done():
+                self.logger.error("Context agent %s timed out", key)
+                continue
+            try:
+                result = future.result()
+                if isinstance(result, dict):
+                    context_results.update(result)
+            except Exception as e:
+                self.logger.error("Context agent %s failed: %s", key, e)
+                # Continue with other agents
+                continue
+        # Don't block the case on a straggler; its late result is discarded
+        executor.shutdown(wait=False)
         
         return context_results
 
@@ -108,10 +144,7 @@ class SupervisorAgent(Agent):
         prompt = self._build_final_report_prompt(context)
         
         try:
-            report = "".join([token for token in converse_with_claude_stream([
-                {"role": "user", "content": [{"text": prompt}]}
-            ], max_tokens=self.agent_config.max_tokens)])
-            return report
+            return stream_completion(prompt, self.agent_config.max_tokens, system=FINAL_REPORT_SYSTEM_PROMPT)
         except Exception as e:
             self.logger.error(f"Failed to generate final report: {e}")
             return "Final report unavailable due to technical issues"
@@ -124,27 +157,10 @@ class SupervisorAgent(Agent):
         # Build conversation summary
         conversation_summary = self._build_final_conversation_summary(context)
         
-        prompt = f"""
-You are a senior fraud analyst at XYZ Bank. Based on the following comprehensive investigation, provide a clear, professional final report.
-
-INVESTIGATION CONTEXT:
-{context_summary}
-
-CUSTOMER CONVERSATION:
-{conversation_summary}
-
-REPORT REQUIREMENTS:
-1. Executive Summary: Key findings and decision
-2. Risk Assessment: Detailed risk analysis and factors
-3. Scam Typology: Specific scam type identified (if any)
-4. Customer Impact: Vulnerability assessment and protection measures
-5. Regulatory Compliance: AUSTRAC, APRA, and other requirements
-6. Recommendations: Immediate actions and follow-up steps
-7. Lessons Learned: System improvements and process enhancements
-
-Provide a comprehensive, professional report suitable for senior management and regulatory reporting.
-"""
-        return prompt
+        return FINAL_REPORT_PROMPT_TEMPLATE.format(
+            context_summary=context_summary,
+            conversation_summary=conversation_summary,
+        )
 
     def _build_final_context_summary(self, context: Dict[str, Any]) -> str:
         """Build a summary of the final context for the report."""
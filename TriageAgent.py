@@ -2,8 +2,8 @@ from strands import Agent, tool
 from typing import Dict, Any, List
 import json
 from datetime import datetime
-from aws_bedrock import converse_with_claude_stream
 from config import config
+from agent_utils import stream_completion
 from vector_utils import search_similar
 import logging
 
@@ -123,10 +123,7 @@ Provide a concise, expert-level triage decision for fraud operations.
 
     def _get_expert_triage(self, prompt: str) -> str:
         try:
-            result = "".join([token for token in converse_with_claude_stream([
-                {"role": "user", "content": [{"text": prompt}]}
-            ], max_tokens=self.agent_config.max_tokens)])
-            return result
+            return stream_completion(prompt, self.agent_config.max_tokens)
         except Exception as e:
             self.logger.error(f"Failed to get expert triage: {e}")
             return "Triage decision unavailable due to technical issues"
@@ -13,8 +13,8 @@ import re
 from abc import ABC, abstractmethod
 
 from vector_utils import search_similar
-from aws_bedrock import converse_with_claude_stream
 from config import config
+from agent_utils import stream_completion
 
 # Import Mem0 integration
 try:
@@ -358,10 +358,7 @@ Decision:
     def _get_agent_response(self, prompt: str) -> str:
         """Get agent response with error handling"""
         try:
-            response = "".join([token for token in converse_with_claude_stream([
-                {"role": "user", "content": [{"text": prompt}]}
-            ], max_tokens=self.agent_config.max_tokens)])
-            return response
+            return stream_completion(prompt, self.agent_config.max_tokens)
         except Exception as e:
             self.logger.error(f"Failed to get agent response: {e}")
             return "Unable to process request"
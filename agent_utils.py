@@ -0,0 +1,277 @@
+"""
+Shared Agent Utilities
+Dataset access, SOP retrieval and Claude analysis helpers shared by the context agents
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+import yaml
+
+from config import config
+# Dataset helpers are re-exported so agents share one cached loader and alias table
+from dataset_loader import load_json, load_index, normalize_field_names, prewarm_indexes
+# aws_bedrock (boto3) and sop_cache (qdrant-client, numpy) are imported on first
+# use, so loading an agent module doesn't pay their multi-second import
+
+# Optional native JSON encoder for prompt assembly
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# LibYAML-backed loader when PyYAML was built with it; same safe semantics either way
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+ANALYSIS_UNAVAILABLE = "Analysis unavailable due to technical issues"
+
+logger = logging.getLogger(__name__)
+
+# Finished analyses keyed by agent, case ids and SOP context: {key: (timestamp, text)}
+_ANALYSIS_CACHE: Dict[bytes, Tuple[float, str]] = {}
+_ANALYSIS_CACHE_MAX_ENTRIES = 1024
+_analysis_cache_lock = threading.Lock()
+
+
+class IndicatorTiers:
+    """Weighted indicator tiers matched in a single scan of the analysis text"""
+
+    def __init__(self, tiers: List[Tuple[List[str], float]]):
+        self._deltas = [delta for _, delta in tiers]
+        self._tier_of = {}
+        for tier, (indicators, _) in enumerate(tiers):
+            for indicator in indicators:
+                self._tier_of.setdefault(indicator, tier)
+        alternation = '|'.join(map(re.escape, sorted(self._tier_of, key=len, reverse=True)))
+        # Zero-width lookahead reports a match at every position, so overlapping
+        # indicators from different tiers are all seen in the one pass
+        self._pattern = re.compile(f'(?=({alternation}))')
+
+    def score(self, text_lower: str, base: float = 0.5) -> float:
+        """Apply each tier's delta at most once, stopping as soon as every tier has matched"""
+        seen = 0
+        all_seen = (1 << len(self._deltas)) - 1
+        for match in self._pattern.finditer(text_lower):
+            seen |= 1 << self._tier_of[match.group(1)]
+            if seen == all_seen:
+                break
+        score = base
+        for tier, delta in enumerate(self._deltas):
+            if seen & (1 << tier):
+                score += delta
+        return max(0.0, min(1.0, score))
+
+
+class KeywordMatcher:
+    """Fixed keyword set whose substring occurrences are collected in a single scan"""
+
+    def __init__(self, keywords: Iterable[str]):
+        keywords = set(keywords)
+        # A match of one keyword also implies every keyword it contains, which the
+        # scan alone would miss when both start at the same position
+        self._implied = {kw: frozenset(k for k in keywords if k in kw) for kw in keywords}
+        alternation = '|'.join(map(re.escape, sorted(keywords, key=len, reverse=True)))
+        self._pattern = re.compile(f'(?=({alternation}))')
+
+    def iter_matches(self, text_lower: str) -> Iterator[FrozenSet[str]]:
+        """Keywords found at each match position, left to right, so callers can stop early"""
+        for match in self._pattern.finditer(text_lower):
+            yield self._implied[match.group(1)]
+
+    def findall(self, text_lower: str) -> Set[str]:
+        """Every keyword occurring in text_lower, as `kw in text_lower` would report"""
+        found = set()
+        for keywords in self.iter_matches(text_lower):
+            found |= keywords
+        return found
+
+
+# Sized for a few cases' context fields plus their dialogue turns
+@lru_cache(maxsize=1024)
+def _lower(text: str) -> str:
+    return text.lower()
+
+
+def cached_lower(context: Dict[str, Any], key: str) -> str:
+    """Lowercased context[key], computed once per value and shared by every scorer"""
+    value = context.get(key) or ''
+    if not isinstance(value, str):
+        value = str(value)
+    # Memoized by the text itself rather than on the context, which is serialised session state
+    return _lower(value)
+
+
+# (epoch second, formatted) swapped as one tuple so threads never see a torn pair
+_now_iso_cache: Tuple[int, str] = (0, '')
+
+
+def _parse_yaml_block(block: str) -> Optional[Dict[str, Any]]:
+    try:
+        loaded = yaml.load(block, Loader=_YamlLoader)
+    except Exception:
+        return None
+    return loaded if isinstance(loaded, dict) else None  # Only keep dicts
+
+
+@lru_cache(maxsize=8)
+def _load_fraud_yaml_cached(filepath: str, mtime: float) -> Tuple[Dict[str, Any], ...]:
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+    # The datasets are markdown with YAML blocks between '---' lines, and the
+    # markdown (preamble and sections between blocks) isn't valid YAML. A single
+    # yaml.load_all stream aborts at the first such section, so each block is
+    # parsed on its own and unparseable ones are skipped
+    blocks = [block.strip() for block in content.split('---')]
+    loaded = [_parse_yaml_block(block) for block in blocks if block]
+    return tuple(block for block in loaded if block is not None)
+
+
+def load_fraud_yaml_blocks(filepath):
+    """Parsed YAML blocks of a dataset, shared across agents until the file changes"""
+    return list(_load_fraud_yaml_cached(filepath, os.stat(filepath).st_mtime))
+
+
+def now_iso() -> str:
+    """Local-time ISO timestamp at second resolution, formatted at most once per second"""
+    global _now_iso_cache
+    second = int(time.time())
+    cached = _now_iso_cache
+    if cached[0] != second:
+        cached = (second, datetime.fromtimestamp(second).isoformat())
+        _now_iso_cache = cached
+    return cached[1]
+
+
+def normalized_alert(context: Dict[str, Any]) -> Dict[str, Any]:
+    """The case's alert with canonical field names, so callers do single-key lookups"""
+    transaction = context.get('transaction')
+    return normalize_field_names(transaction) if isinstance(transaction, dict) else {}
+
+
+def _sop_texts(hits: List[Any]) -> List[str]:
+    return [hit['text'] if isinstance(hit, dict) and 'text' in hit else str(hit) for hit in hits]
+
+
+def prefetch_sops(queries: List[str], logger: logging.Logger = logger) -> None:
+    """Warm the shared SOP caches for several upcoming retrieve_sop queries with one batched search"""
+    queries = [query for query in dict.fromkeys(queries) if query]
+    if not queries:
+        return
+    try:
+        # Fills the query-embedding LRU and the proximity cache that retrieve_sop looks in
+        from sop_cache import search_similar_batch_cached
+        search_similar_batch_cached(queries, top_k=3)
+    except Exception as e:
+        # retrieve_sop will look each query up on its own
+        logger.warning("SOP prefetch failed: %s", e)
+
+
+def retrieve_sop(context, query: Optional[str] = None, logger: logging.Logger = logger) -> List[str]:
+    """Retrieve SOP snippets via vector search, falling back to the raw SOP.md lines"""
+    # Dynamic RAG: use vector search if query provided. Repeats across agents and cases are
+    # served by the module-level proximity cache, so nothing is kept on the context
+    if query:
+        from sop_cache import search_similar_cached
+        return _sop_texts(search_similar_cached(query, top_k=3))
+    # Fallback: simple keyword search over SOP.md
+    try:
+        from sop_cache import load_sop_lines
+        return load_sop_lines()
+    except Exception as e:
+        logger.error("Error reading SOP file: %s", e)
+        return []
+
+
+def dumps_pretty(data: Any) -> str:
+    """Indented JSON for prompts, using orjson when installed"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            # Values orjson can't encode fall through to the stdlib encoder
+            pass
+    return json.dumps(data, indent=2)
+
+
+def stream_completion(prompt: str, max_tokens: int, on_token: Optional[Callable[[str], None]] = None,
+                      system: Optional[str] = None) -> str:
+    """Full Claude completion for prompt, handing each token to on_token as it arrives.
+
+    A static role preamble, when given, is sent as the system prompt.
+    """
+    from aws_bedrock import converse_with_claude_stream
+    tokens = converse_with_claude_stream([
+        {"role": "user", "content": [{"text": prompt}]}
+        ], max_tokens=max_tokens, system=system)
+    if on_token is None:
+        return "".join(tokens)
+    parts = []
+    for token in tokens:
+        on_token(token)
+        parts.append(token)
+    return "".join(parts)
+
+
+def get_expert_analysis(prompt: str, max_tokens: int, logger: logging.Logger = logger,
+                        on_token: Optional[Callable[[str], None]] = None, system: Optional[str] = None) -> str:
+    """Get expert analysis with error handling"""
+    try:
+        return stream_completion(prompt, max_tokens, on_token=on_token, system=system)
+    except Exception as e:
+        logger.error("Failed to get expert analysis: %s", e)
+        return ANALYSIS_UNAVAILABLE
+
+
+
+def analysis_cache_key(agent_name: str, customer_id: Any, alert_id: Any, sops: List[str]) -> bytes:
+    """Compact digest identifying one agent's analysis of one case"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{agent_name}:{customer_id}:{alert_id}".encode('utf-8'))
+    for sop in sops:
+        h.update(b'\x00')
+        h.update(sop.encode('utf-8'))
+    return h.digest()
+
+
+def analysis_cache_get(key: bytes, ttl: float) -> Optional[str]:
+    """Cached analysis for key if younger than ttl seconds"""
+    entry = _ANALYSIS_CACHE.get(key)
+    if entry is not None and time.time() - entry[0] <= ttl:
+        return entry[1]
+    return None
+
+
+def analysis_cache_set(key: bytes, analysis: str) -> None:
+    """Store a successful analysis; fallbacks and invocation errors are never cached"""
+    if not analysis or analysis == ANALYSIS_UNAVAILABLE or analysis.startswith("Configuration/Invocation error"):
+        return
+    with _analysis_cache_lock:
+        _ANALYSIS_CACHE.pop(key, None)
+        _ANALYSIS_CACHE[key] = (time.time(), analysis)
+        # Dicts keep insertion order, so the first key is the oldest write
+        while len(_ANALYSIS_CACHE) > _ANALYSIS_CACHE_MAX_ENTRIES:
+            _ANALYSIS_CACHE.pop(next(iter(_ANALYSIS_CACHE)))
+
+
+def run_batch(analyze: Callable[[Dict[str, Any]], Dict[str, Any]], contexts: List[Dict[str, Any]],
+              max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Run a per-alert analysis over many contexts concurrently, preserving input order"""
+    if not contexts:
+        return []
+    workers = min(max_workers or config.environment['MAX_CONCURRENT_AGENTS'], len(contexts))
+    # The analysis is dominated by Bedrock/vector DB round trips, so threads overlap the waits
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(analyze, contexts))
@@ -293,7 +293,10 @@ def stream_strands_steps(alert_or_state):
         if finished or turn_count >= max_turns:
             done = True
 
-    # Step 5: Policy Decision
+    # Step 5: Policy Decision, after the closing final risk assessment it relies on
+    final_risk_result = risk_assessor_agent.assess_risk(state, is_final=True)
+    if final_risk_result:
+        state.update(final_risk_result)
     policy_result = policy_decision_agent.make_policy_decision(state)
     if policy_result:
         state.update(policy_result)
@@ -11,13 +11,13 @@ from aws_bedrock import converse_with_claude_stream
 import re
 import concurrent.futures
 from vector_utils import search_similar
-import yaml
 import types
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import logging
 
 from config import config
+from agent_utils import load_fraud_yaml_blocks
 
 DATASET_DIR = os.path.join(os.path.dirname(__file__), 'datasets')
 
@@ -119,22 +119,6 @@ def rag_retrieve_sop(context, query=None):
         pass
     return sops
 
-def load_fraud_yaml_blocks(filepath):
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-    blocks = content.split('---')
-    parsed = []
-    for block in blocks:
-        block = block.strip()
-        if block:
-            try:
-                loaded = yaml.safe_load(block)
-                if isinstance(loaded, dict):  # Only keep dicts
-                    parsed.append(loaded)
-            except Exception:
-                continue
-    return parsed
-
 class TransactionContextAgent(IntelligentAgent):
     """Advanced transaction context analysis agent with expert fraud detection capabilities"""
     
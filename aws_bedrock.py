@@ -1,10 +1,12 @@
 
 import os
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import json
 import logging
 import re
+import threading
 import time
 from functools import lru_cache
 from dotenv import load_dotenv
@@ -14,11 +16,28 @@ load_dotenv()
 # Claude: ONLY AWS_CLAUDE_INFERENCE_PROFILE_ARN (Inference Profile ARN)
 # Titan (embeddings): ONLY AWS_TITAN_MODEL_ID (handled in vector_utils)
 _client = None
+_client_lock = threading.Lock()
+# The one client is shared by every agent thread; size its HTTPS pool so concurrent
+# agents and batched cases reuse connections instead of opening new ones
+MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "32"))
 
 def _get_client():
     global _client
     if _client is None:
-        _client = boto3.client("bedrock-runtime", region_name=os.getenv("AWS_REGION", "us-east-1"))
+        # Agents start in parallel; build the client (and its TLS pool) once, not per racing thread
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client(
+                    "bedrock-runtime",
+                    region_name=os.getenv("AWS_REGION", "us-east-1"),
+                    config=Config(
+                        max_pool_connections=MAX_POOL_CONNECTIONS,
+                        # Keep idle pooled connections alive between agent steps
+                        tcp_keepalive=True,
+                        # Client-side rate limiting backs concurrent agents off together when throttled
+                        retries={"mode": "adaptive"},
+                    ),
+                )
     return _client
 
 INFERENCE_PROFILE_ARN = os.getenv("AWS_CLAUDE_INFERENCE_PROFILE_ARN")
@@ -52,13 +71,27 @@ def _cache_set(key: str, val: str):
         pass
 
 
+# "optimized" requests latency-optimized inference where the model and region offer it
+PERFORMANCE_LATENCY = os.getenv("BEDROCK_PERFORMANCE_LATENCY", "standard")
+
+
+def _request_options(system=None) -> dict:
+    """Optional Converse arguments shared by the streaming and non-streaming calls"""
+    options = {}
+    if system:
+        options["system"] = [{"text": system}]
+    if PERFORMANCE_LATENCY != "standard":
+        options["performanceConfig"] = {"latency": PERFORMANCE_LATENCY}
+    return options
+
+
 @lru_cache(maxsize=64)
 def _model_id() -> str:
     if not INFERENCE_PROFILE_ARN:
         raise RuntimeError("AWS_CLAUDE_INFERENCE_PROFILE_ARN is not set")
     return INFERENCE_PROFILE_ARN
 
-def converse_with_claude_stream(messages, max_tokens=512, temperature=0.5, top_p=0.9):
+def converse_with_claude_stream(messages, max_tokens=512, temperature=0.5, top_p=0.9, system=None):
     """
     Sends a conversation to Claude 4 Sonnet via Bedrock's streaming API and yields tokens as they arrive.
     Args:
@@ -66,6 +99,7 @@ def converse_with_claude_stream(messages, max_tokens=512, temperature=0.5, top_p
         max_tokens (int): Max tokens for the response.
         temperature (float): Sampling temperature.
         top_p (float): Nucleus sampling parameter.
+        system (str): Optional static system prompt for the agent's role.
     Yields:
         str: Next token from the streamed response.
     """
@@ -84,6 +118,7 @@ def converse_with_claude_stream(messages, max_tokens=512, temperature=0.5, top_p
                         "temperature": temperature,
                         "topP": top_p
                     },
+                    **_request_options(system),
                 )
                 for chunk in streaming_response["stream"]:
                     if "contentBlockDelta" in chunk:
@@ -142,6 +177,7 @@ def converse_with_claude(messages, max_tokens=512, temperature=0.5, top_p=0.9):
                         "temperature": temperature,
                         "topP": top_p
                     },
+                    **_request_options(),
                 )
                 break
             except Exception as ie:
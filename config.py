@@ -203,6 +203,13 @@ class DynamicConfig:
             'MAX_CONCURRENT_AGENTS': int(os.getenv('MAX_CONCURRENT_AGENTS', '4')),
             'REQUEST_TIMEOUT': int(os.getenv('REQUEST_TIMEOUT', '30')),
             'RETRY_ATTEMPTS': int(os.getenv('RETRY_ATTEMPTS', '3')),
+            'SOP_CACHE_SIZE': int(os.getenv('SOP_CACHE_SIZE', '256')),
+            'SOP_CACHE_TOLERANCE': float(os.getenv('SOP_CACHE_TOLERANCE', '0.02')),
+            'SOP_CACHE_TTL': float(os.getenv('SOP_CACHE_TTL', '600')),
+            'POLICY_LLM_SHORTCIRCUIT': os.getenv('POLICY_LLM_SHORTCIRCUIT', 'false').lower() == 'true',
+            'POLICY_SHORTCIRCUIT_SCORE': float(os.getenv('POLICY_SHORTCIRCUIT_SCORE', '0.9')),
+            'SYNTHESIS_LLM_SHORTCIRCUIT': os.getenv('SYNTHESIS_LLM_SHORTCIRCUIT', 'false').lower() == 'true',
+            'SYNTHESIS_SHORTCIRCUIT_MIN_FLAGS': int(os.getenv('SYNTHESIS_SHORTCIRCUIT_MIN_FLAGS', '3')),
         }
     
     def _initialize_agent_configs(self) -> Dict[str, AgentConfig]:
@@ -0,0 +1,150 @@
+"""
+Shared Dataset Loader
+Parses each dataset file once per process and re-parses only when the file changes
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+# Optional native JSON parser for the multi-MB dataset files
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+DATASET_DIR = 'datasets'
+
+
+# Canonical field name -> accepted aliases, in order of preference
+FIELD_MAPPINGS = {
+    'alert_id': ['alertId', 'alert_id'],
+    'customer_id': ['customerId', 'customer_id'],
+    'transaction_id': ['transactionId', 'transaction_id'],
+    'rule_id': ['ruleId', 'rule_id'],
+    'payee_payer_name': ['payeePayerName', 'payee_payer_name', 'payee'],
+    'transaction_type': ['transactionType', 'transaction_type'],
+    'transaction_date': ['transactionDate', 'transaction_date'],
+    'amount': ['amount'],
+    'currency': ['currency'],
+    'risk_score': ['riskScore', 'risk_score'],
+    'escalation_level': ['escalationLevel', 'escalation_level']
+}
+
+# Flattened alias -> (canonical name, preference) table built once at import
+_ALIASES = {
+    alias: (canonical, preference)
+    for canonical, aliases in FIELD_MAPPINGS.items()
+    for preference, alias in enumerate(aliases)
+}
+_KNOWN_ALIASES = frozenset(_ALIASES)
+
+
+def normalize_field_names(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize field names to handle both old and new formats"""
+    if _KNOWN_ALIASES.isdisjoint(data):
+        # Nothing to rename: a C-level copy beats the per-key loop
+        return dict(data)
+    normalized = {}
+    preferences = {}
+    for key, value in data.items():
+        canonical, preference = _ALIASES.get(key, (key, 0))
+        # When several aliases are present, the earliest one in FIELD_MAPPINGS wins
+        if preferences.get(canonical, preference + 1) <= preference:
+            continue
+        normalized[canonical] = value
+        preferences[canonical] = preference
+    return normalized
+
+
+@dataclass
+class DatasetIndex:
+    """Normalized records of one dataset collection with O(1) id lookups"""
+    records: List[Dict[str, Any]] = field(default_factory=list)
+    by_customer: Dict[Any, int] = field(default_factory=dict)
+    by_alert: Dict[Any, int] = field(default_factory=dict)
+
+    def find(self, customer_id: Optional[str] = None, alert_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the first record matching either id, in file order"""
+        positions = [pos for pos in (self.by_customer.get(customer_id), self.by_alert.get(alert_id))
+                     if pos is not None]
+        # Copy so callers can annotate the record without touching the shared cache
+        return dict(self.records[min(positions)]) if positions else None
+
+
+@lru_cache(maxsize=16)
+def _load_json_cached(path: str, mtime: float):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # orjson is stricter than json (e.g. NaN); let the stdlib parser decide
+            pass
+    return json.loads(raw)
+
+
+def load_json(filename):
+    """Load a dataset JSON file; the parsed result is shared and must not be mutated"""
+    path = os.path.join(DATASET_DIR, filename)
+    try:
+        return _load_json_cached(path, os.stat(path).st_mtime)
+    except Exception as e:
+        print(f"Error loading {filename}: {e}")
+        return {}
+
+
+def build_index(records: List[Dict[str, Any]]) -> DatasetIndex:
+    """Normalize records once and index them by customer_id and alert_id"""
+    index = DatasetIndex()
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        normalized = normalize_field_names(record)
+        pos = len(index.records)
+        index.records.append(normalized)
+        customer_id = normalized.get('customer_id')
+        alert_id = normalized.get('alert_id')
+        if customer_id is not None:
+            index.by_customer.setdefault(customer_id, pos)
+        if alert_id is not None:
+            index.by_alert.setdefault(alert_id, pos)
+    return index
+
+
+@lru_cache(maxsize=16)
+def _load_index_cached(path: str, mtime: float, collection_key: str) -> DatasetIndex:
+    data = _load_json_cached(path, mtime)
+    if isinstance(data, dict) and collection_key in data:
+        records = data[collection_key]
+    elif isinstance(data, list):
+        records = data
+    else:
+        records = []
+    return build_index(records)
+
+
+def load_index(filename: str, collection_key: str) -> DatasetIndex:
+    """Load a dataset and its id index; both are cached until the file changes"""
+    path = os.path.join(DATASET_DIR, filename)
+    try:
+        return _load_index_cached(path, os.stat(path).st_mtime, collection_key)
+    except Exception as e:
+        print(f"Error indexing {filename}: {e}")
+        return DatasetIndex()
+
+
+def prewarm_indexes(datasets: List[Tuple[str, str]]) -> threading.Thread:
+    """Parse and index (filename, collection_key) datasets on a background thread"""
+    def _prewarm():
+        for filename, collection_key in datasets:
+            load_index(filename, collection_key)
+
+    thread = threading.Thread(target=_prewarm, name="dataset-prewarm", daemon=True)
+    thread.start()
+    return thread
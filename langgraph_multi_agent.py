@@ -6,6 +6,7 @@ Pure Strands framework implementation for fraud detection and risk assessment
 import os
 import asyncio
 import concurrent.futures
+import queue
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import time
@@ -23,6 +24,7 @@ from DialogueAgent import dialogue_agent
 from RiskAssessorAgent import risk_assessor_agent
 from PolicyDecisionAgent import policy_decision_agent
 from FeedbackCollectorAgent import feedback_collector_agent
+from agent_utils import prefetch_sops
 
 # Optional enhanced dialogue agent with XAI
 try:
@@ -239,6 +241,8 @@ def run_strands_multi_agent(alert, max_steps=None):
     
     # 5. PolicyDecisionAgent (only if finalization occurred and not already run)
     if (max_steps is None or step < max_steps) and (state.get('chat_done') or state.get('risk_ready_to_finalize') or state.get('finalized_by_risk')) and not state.get('policy_decision_done'):
+        # Policy and feedback SOPs come back from one batched vector search
+        prefetch_sops([policy_decision_agent.sop_query(state), feedback_collector_agent.sop_query(state)])
         result = policy_decision_agent.make_policy_decision(state)
         state['logs'].append("PolicyDecisionAgent")
         response_text = result.get('policy_decision', '[No response]') if result and isinstance(result, dict) else '[No response]'
@@ -459,6 +463,32 @@ def _build_xai_decision(state: Dict[str, Any]) -> Dict[str, Any]:
     }
     return xai
 
+STREAM_FLUSH_INTERVAL = 0.1  # seconds between partial-response UI updates
+
+def _stream_agent_tokens(state: Dict[str, Any], run):
+    """Run run(on_token) on a worker thread, yielding state snapshots as tokens accumulate.
+
+    The partial text is written into the last agent_responses slot, which the
+    caller must have appended as a placeholder. Returns run's result.
+    """
+    tokens: "queue.Queue[str]" = queue.Queue()
+    buffer: List[str] = []
+    last_flush = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(run, tokens.put)
+        while True:
+            try:
+                buffer.append(tokens.get(timeout=STREAM_FLUSH_INTERVAL))
+            except queue.Empty:
+                if future.done() and tokens.empty():
+                    break
+            now = time.monotonic()
+            if buffer and now - last_flush >= STREAM_FLUSH_INTERVAL:
+                state['agent_responses'][-1] = "".join(buffer)
+                last_flush = now
+                yield state.copy()
+        return future.result()
+
 @performance_monitor
 def stream_strands_steps(state):
     """Optimized streaming implementation with parallel execution using Strands agents"""
@@ -752,6 +782,8 @@ def stream_strands_steps(state):
         
         # Ensure dialogue_history is included for final assessment
         state.setdefault('dialogue_history', state.get('dialogue_history', []))
+        # Final risk and policy SOPs come back from one batched vector search
+        prefetch_sops([risk_assessor_agent.sop_query(state), policy_decision_agent.sop_query(state)])
         risk_summary_result = risk_assessor_agent.assess_risk(state, is_final=True)
         if risk_summary_result and isinstance(risk_summary_result, dict):
             state.update(risk_summary_result)
@@ -768,10 +800,15 @@ def stream_strands_steps(state):
         # Policy Decision (always run after finalization, once)
         print("📋 Running policy decision...")
         if not state.get('policy_decision_done'):
-            policy_result = policy_decision_agent.make_policy_decision(state)
+            # Stream tokens into a placeholder so the UI shows the decision as it is written
             state['logs'].append("PolicyDecisionAgent")
+            state['agent_responses'].append('')
+            state['streaming_agent'] = 'PolicyDecisionAgent'
+            policy_result = yield from _stream_agent_tokens(
+                state, lambda on_token: policy_decision_agent.stream_policy_decision(state, on_token=on_token)
+            )
             response_text = policy_result.get('policy_decision', '[No response]') if policy_result and isinstance(policy_result, dict) else '[No response]'
-            state['agent_responses'].append(response_text)
+            state['agent_responses'][-1] = response_text
             # Store policy decision to memory
             store_to_memory(state, str(response_text), "PolicyDecisionAgent", "policy")
             if policy_result and isinstance(policy_result, dict):
@@ -17,6 +17,8 @@ If QDRANT_URL is not provided, or QDRANT_STUB=1, we use a fast local store to av
 QDRANT_URL = os.getenv("QDRANT_URL")  # No default to avoid accidental network calls
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 QDRANT_FORCE_STUB = os.getenv("QDRANT_STUB", "0").lower() in ("1", "true", "yes")
+# Storage for newly created collections: int8 (scalar quantized, rescored), float16, or none (float32)
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "int8").strip().lower()
 
 
 class _InMemoryQdrant:
@@ -105,6 +107,22 @@ def _map_distance(distance: str):
         return distance
 
 
+def _vector_storage(vector_size: int, distance: str) -> Dict[str, Any]:
+    """recreate_collection kwargs for QDRANT_QUANTIZATION, dropping options the installed SDK lacks"""
+    dist = _map_distance(distance)
+    options: Dict[str, Any] = {}
+    if QDRANT_QUANTIZATION == "float16" and hasattr(qmodels, "Datatype"):
+        options["vectors_config"] = qmodels.VectorParams(size=vector_size, distance=dist, datatype=qmodels.Datatype.FLOAT16)
+    else:
+        options["vectors_config"] = qmodels.VectorParams(size=vector_size, distance=dist)
+    if QDRANT_QUANTIZATION == "int8" and hasattr(qmodels, "ScalarQuantization"):
+        # int8 codes are searched from RAM and the top candidates rescored against the originals
+        options["quantization_config"] = qmodels.ScalarQuantization(
+            scalar=qmodels.ScalarQuantizationConfig(type=qmodels.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    return options
+
+
 def ensure_collection(collection_name: str, vector_size: int, distance: str = "Cosine") -> None:
     try:
         existing = qdrant_client.get_collection(collection_name)
@@ -115,10 +133,9 @@ def ensure_collection(collection_name: str, vector_size: int, distance: str = "C
     try:
         if QDRANT_SDK_AVAILABLE and not isinstance(qdrant_client, _InMemoryQdrant):
             # Newer qdrant-client expects Distance enum, and supports with_payload options in queries
-            dist = _map_distance(distance)
             qdrant_client.recreate_collection(
                 collection_name=collection_name,
-                vectors_config=qmodels.VectorParams(size=vector_size, distance=dist),
+                **_vector_storage(vector_size, distance),
             )
         else:
             qdrant_client.recreate_collection(collection_name, {"size": vector_size})
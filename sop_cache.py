@@ -0,0 +1,152 @@
+"""
+Approximate SOP Retrieval Cache
+Reuses vector search hits for near-duplicate queries using cosine proximity
+"""
+
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from config import config
+from vector_utils import embed_text, embed_texts, search_similar, search_similar_batch
+
+
+SOP_PATH = 'datasets/SOP.md'
+
+
+@lru_cache(maxsize=4)
+def _read_sop_lines(path: str, mtime: float) -> Tuple[str, ...]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    # One C-level split of the whole file instead of a Python loop over readline()
+    return tuple(line.decode('utf-8').strip() for line in data.splitlines() if line.strip())
+
+
+def load_sop_lines(path: str = SOP_PATH) -> List[str]:
+    """Non-empty stripped SOP.md lines, read once and re-read only when the file changes"""
+    return list(_read_sop_lines(path, os.stat(path).st_mtime))
+
+
+class ProximityCache:
+    """Bounded LRU cache keyed by query embedding with a cosine-distance tolerance
+
+    Embeddings are stored as int8 codes with a per-vector scale, a quarter of the
+    float32 footprint, and compared with an int32-accumulated dot product. Entries
+    older than ttl seconds are ignored so re-ingested SOPs are picked up.
+    """
+
+    def __init__(self, capacity: int = 256, tolerance: float = 0.02, ttl: Optional[float] = None):
+        self.capacity = max(1, capacity)
+        self.tolerance = tolerance
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._stored_at: Optional[np.ndarray] = None
+        self._hits: List[Any] = []
+        self._top_k: List[int] = []
+        self._last_used: List[int] = []
+        self._tick = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def _quantize(vector) -> Tuple[np.ndarray, float]:
+        """L2-normalize and symmetric-quantize an embedding to (int8 codes, scale)"""
+        q = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm:
+            q = q / norm
+        peak = float(np.max(np.abs(q))) if q.size else 0.0
+        scale = peak / 127.0 if peak else 1.0
+        return np.round(q / scale).astype(np.int8), scale
+
+    def lookup(self, vector, top_k: int):
+        """Return cached hits for the closest stored query within tolerance, else None"""
+        codes, scale = self._quantize(vector)
+        with self._lock:
+            n = len(self._hits)
+            if not n or self._codes.shape[1] != codes.shape[0]:
+                self.stats['misses'] += 1
+                return None
+            # Widen before the product so int8 * int8 sums can't overflow
+            sims = (self._codes[:n].astype(np.int32) @ codes.astype(np.int32)) * self._scales[:n] * scale
+            if self.ttl:
+                sims[time.time() - self._stored_at[:n] > self.ttl] = -np.inf
+            best = int(np.argmax(sims))
+            if sims[best] >= 1.0 - self.tolerance and self._top_k[best] >= top_k:
+                self._tick += 1
+                self._last_used[best] = self._tick
+                self.stats['hits'] += 1
+                return self._hits[best][:top_k]
+            self.stats['misses'] += 1
+            return None
+
+    def insert(self, vector, top_k: int, hits: List[Any]):
+        """Store hits for a query embedding, evicting the least recently used entry when full"""
+        codes, scale = self._quantize(vector)
+        with self._lock:
+            if self._codes is None or self._codes.shape[1] != codes.shape[0]:
+                # (Re)allocate on first insert or when the embedding model dimension changes
+                self._codes = np.zeros((self.capacity, codes.shape[0]), dtype=np.int8)
+                self._scales = np.zeros(self.capacity, dtype=np.float32)
+                self._stored_at = np.zeros(self.capacity, dtype=np.float64)
+                self._hits, self._top_k, self._last_used = [], [], []
+            self._tick += 1
+            if len(self._hits) < self.capacity:
+                slot = len(self._hits)
+                self._hits.append(hits)
+                self._top_k.append(top_k)
+                self._last_used.append(self._tick)
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._hits[slot] = hits
+                self._top_k[slot] = top_k
+                self._last_used[slot] = self._tick
+                self.stats['evictions'] += 1
+            self._codes[slot] = codes
+            self._scales[slot] = scale
+            self._stored_at[slot] = time.time()
+
+    def clear(self):
+        with self._lock:
+            self._codes = None
+            self._scales = None
+            self._stored_at = None
+            self._hits, self._top_k, self._last_used = [], [], []
+
+
+sop_cache = ProximityCache(
+    capacity=config.environment['SOP_CACHE_SIZE'],
+    tolerance=config.environment['SOP_CACHE_TOLERANCE'],
+    ttl=config.environment['SOP_CACHE_TTL'],
+)
+
+
+def search_similar_cached(query: str, top_k: int = 3) -> List[Any]:
+    """search_similar with near-duplicate queries served from the proximity cache"""
+    vector = embed_text(query)
+    hits = sop_cache.lookup(vector, top_k)
+    if hits is not None:
+        return hits
+    hits = search_similar(query, top_k=top_k)
+    if hits:
+        # Empty results usually mean the vector DB was unreachable; don't pin them
+        sop_cache.insert(vector, top_k, hits)
+    return hits
+
+
+def search_similar_batch_cached(queries: List[str], top_k: int = 3) -> List[List[Any]]:
+    """search_similar_cached for several queries, sending every cache miss in one batch"""
+    vectors = embed_texts(queries)
+    results: List[Optional[List[Any]]] = [sop_cache.lookup(vector, top_k) for vector in vectors]
+    misses = [i for i, hits in enumerate(results) if hits is None]
+    if misses:
+        for i, hits in zip(misses, search_similar_batch([queries[i] for i in misses], top_k=top_k)):
+            results[i] = hits
+            if hits:
+                sop_cache.insert(vectors[i], top_k, hits)
+    return results
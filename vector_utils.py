@@ -1,9 +1,10 @@
-import boto3
+import concurrent.futures
 import json
 from qdrant_client import QdrantClient
 import os
 import hashlib
 from functools import lru_cache
+from qdrant_client.http import models
 from qdrant_client.http.models import PointStruct
 
 # Titan Embeddings (use env override)
@@ -17,13 +18,10 @@ COLLECTION_NAME = "sop_embeddings"
 DEFAULT_VECTOR_SIZE = 1024
 
 
-_bedrock_client = None
-
 def _get_bedrock_client():
-    global _bedrock_client
-    if _bedrock_client is None:
-        _bedrock_client = boto3.client("bedrock-runtime", region_name=os.getenv("AWS_REGION", "us-east-1"))
-    return _bedrock_client
+    # Embeddings share the Claude runtime client and its connection pool
+    from aws_bedrock import _get_client
+    return _get_client()
 
 @lru_cache(maxsize=2048)
 def _fallback_embed(text: str, dim: int = DEFAULT_VECTOR_SIZE):
@@ -59,6 +57,21 @@ def embed_text(text: str):
         return _fallback_embed(text)
 
 
+def embed_texts(texts):
+    """embed_text for several inputs; Titan takes one input per call, so the requests overlap"""
+    # lru_cache doesn't stop two threads computing the same text, so send each distinct text once
+    unique = list(dict.fromkeys(texts))
+    if len(unique) <= 1:
+        vectors = [embed_text(text) for text in unique]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(unique)) as executor:
+            vectors = list(executor.map(embed_text, unique))
+    if len(unique) == len(texts):
+        return vectors
+    vector_of = dict(zip(unique, vectors))
+    return [vector_of[text] for text in texts]
+
+
 def upsert_embedding(id, text, metadata=None):
     # Compute embedding first to get vector size
     vector = embed_text(text)
@@ -96,6 +109,39 @@ def ingest_documents(doc_paths):
             upsert_embedding(doc_id, chunk, metadata={"source": path, "chunk": i})
 
 
+def _hits_to_questions(hits, top_k):
+    """Pull the bulleted questions out of the SOP chunks referenced by search hits"""
+    questions = []
+    import re
+    for hit in hits:
+        # hit.payload is a dict like {'source': ..., 'chunk': ...}
+        # hit.vector is the embedding, hit.id is the point id
+        # We need to get the original chunk text from the vector store
+        # But since we only stored metadata, we need to re-read the chunk from file
+        source = hit.payload.get('source')
+        chunk_idx = hit.payload.get('chunk')
+        if source and chunk_idx is not None:
+            try:
+                with open(source, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                chunks = [content[i:i+1000] for i in range(0, len(content), 1000)]
+                chunk = chunks[chunk_idx] if chunk_idx < len(chunks) else ''
+                # Extract questions from the chunk
+                # Look for lines that start with - or * and contain a ?
+                for line in chunk.split('\n'):
+                    line = line.strip()
+                    if (line.startswith('-') or line.startswith('*')) and '?' in line:
+                        # Remove leading - or * and whitespace/quotes
+                        q = re.sub(r'^[-*\s\"]+', '', line)
+                        questions.append(q)
+            except (FileNotFoundError, IOError) as file_error:
+                print(f"Error reading file {source}: {file_error}")
+                continue
+        if len(questions) >= top_k:
+            break
+    return questions[:top_k]
+
+
 def search_similar(query, top_k=3):
     # Compute embedding first to get vector size
     vector = embed_text(query)
@@ -127,35 +173,35 @@ def search_similar(query, top_k=3):
             print(f"Error in both query_points and search: {e}, {search_error}")
             return []
     
-    questions = []
-    import re
-    for hit in hits:
-        # hit.payload is a dict like {'source': ..., 'chunk': ...}
-        # hit.vector is the embedding, hit.id is the point id
-        # We need to get the original chunk text from the vector store
-        # But since we only stored metadata, we need to re-read the chunk from file
-        source = hit.payload.get('source')
-        chunk_idx = hit.payload.get('chunk')
-        if source and chunk_idx is not None:
-            try:
-                with open(source, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                chunks = [content[i:i+1000] for i in range(0, len(content), 1000)]
-                chunk = chunks[chunk_idx] if chunk_idx < len(chunks) else ''
-                # Extract questions from the chunk
-                # Look for lines that start with - or * and contain a ?
-                for line in chunk.split('\n'):
-                    line = line.strip()
-                    if (line.startswith('-') or line.startswith('*')) and '?' in line:
-                        # Remove leading - or * and whitespace/quotes
-                        q = re.sub(r'^[-*\s\"]+', '', line)
-                        questions.append(q)
-            except (FileNotFoundError, IOError) as file_error:
-                print(f"Error reading file {source}: {file_error}")
-                continue
-        if len(questions) >= top_k:
-            break
-    return questions[:top_k]
+    return _hits_to_questions(hits, top_k)
+
+
+def search_similar_batch(queries, top_k=3):
+    """search_similar for several queries with one Qdrant round trip; results follow query order"""
+    if not queries:
+        return []
+    vectors = embed_texts(queries)
+    vector_size = len(vectors[0]) if isinstance(vectors[0], list) else DEFAULT_VECTOR_SIZE
+    try:
+        ensure_collection(COLLECTION_NAME, vector_size)
+    except Exception:
+        pass
+    try:
+        responses = qdrant_client.query_batch_points(
+            collection_name=COLLECTION_NAME,
+            requests=[models.QueryRequest(query=vector, limit=top_k, with_payload=True) for vector in vectors]
+        )
+        hit_lists = [response.points for response in responses]
+    except Exception:
+        try:
+            hit_lists = qdrant_client.search_batch(
+                collection_name=COLLECTION_NAME,
+                requests=[models.SearchRequest(vector=vector, limit=top_k, with_payload=True) for vector in vectors]
+            )
+        except Exception:
+            # Clients without batch endpoints still get correct, unbatched results
+            return [search_similar(query, top_k=top_k) for query in queries]
+    return [_hits_to_questions(hits, top_k) for hits in hit_lists]
 
 # --- Enhanced RAG Functions ---
 